@@ -0,0 +1,135 @@
+import asyncio
+from concurrent.futures import Executor
+from deflate import BLOCK_SIZE, Compressor, Decompressor
+from lzss import DEFAULT_LEVEL
+from stats import Stats
+
+# The data is compressed and decompressed in chunks of this size, which
+# limits both the memory and how long a single call runs in the executor.
+CHUNK_SIZE = 2**16
+
+# The compressors keep their state in this process, so the executor has
+# to run the calls in this process, eg. a ThreadPoolExecutor. None means
+# the default executor of the event loop. The calls of one stream are
+# never run at the same time.
+
+
+class CompressWriter:
+    """ Compresses the data written to it into an asyncio.StreamWriter.
+        The compression runs in the executor one chunk at a time,
+        and every chunk waits until the writer has been drained,
+        so a slow reader of the output slows down the writing.
+    """
+    def __init__(self, writer: asyncio.StreamWriter,
+                 level: int = DEFAULT_LEVEL, fmt: str = 'defl',
+                 executor: Executor = None, chunk_size: int = CHUNK_SIZE,
+                 stats: Stats = None, zdict: bytes = None,
+                 strategy: str = 'auto'):
+        self.writer = writer
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.compressor = Compressor(level, BLOCK_SIZE, fmt, stats, zdict,
+                                     strategy)
+
+    async def run(self, function, *args) -> bytearray:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def write(self, data: bytearray):
+        """ Compresses data and writes the compressed blocks that are ready
+        """
+        view = memoryview(data)
+        for start in range(0, len(data), self.chunk_size):
+            chunk = bytes(view[start:start+self.chunk_size])
+            out = await self.run(self.compressor.compress, chunk)
+            if len(out) > 0:
+                self.writer.write(out)
+                await self.writer.drain()
+
+    async def close(self):
+        """ Writes the rest of the compressed data and the end of the stream.
+            The writer is not closed.
+        """
+        self.writer.write(await self.run(self.compressor.flush))
+        await self.writer.drain()
+
+
+class DecompressReader:
+    """ Reads decompressed data from an asyncio.StreamReader of compressed
+        data. More compressed data is read and decompressed in the executor
+        only when the earlier decompressed data has been read, so at most
+        the output of one chunk is kept in memory.
+    """
+    def __init__(self, reader: asyncio.StreamReader, fmt: str = 'defl',
+                 executor: Executor = None, chunk_size: int = CHUNK_SIZE,
+                 stats: Stats = None, zdict: bytes = None):
+        self.reader = reader
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.decompressor = Decompressor(fmt, stats, zdict)
+        self.buffer = bytearray()
+
+    async def fill(self):
+        """ Decompresses chunks until there is data or the stream ends
+        """
+        loop = asyncio.get_running_loop()
+        while len(self.buffer) == 0 and not self.decompressor.eof:
+            chunk = await self.reader.read(self.chunk_size)
+            if len(chunk) == 0:
+                e = 'Unexpected end of data'
+                raise Exception(e)
+            self.buffer += await loop.run_in_executor(
+                self.executor, self.decompressor.decompress, chunk)
+
+    async def read(self, n: int = -1) -> bytearray:
+        """ Returns at most n bytes of decompressed data, or all of it
+            if n is negative. Returns an empty array at the end of the data.
+        """
+        if n < 0:
+            out = bytearray()
+            part = await self.read(self.chunk_size)
+            while len(part) > 0:
+                out += part
+                part = await self.read(self.chunk_size)
+            return out
+
+        await self.fill()
+        out = self.buffer[:n]
+        del self.buffer[:n]
+        return out
+
+    def at_eof(self) -> bool:
+        return len(self.buffer) == 0 and self.decompressor.eof
+
+
+async def compress_stream(reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter,
+                          level: int = DEFAULT_LEVEL, fmt: str = 'defl',
+                          executor: Executor = None,
+                          chunk_size: int = CHUNK_SIZE, stats: Stats = None,
+                          zdict: bytes = None, strategy: str = 'auto'):
+    """ Compresses everything from reader into writer
+    """
+    out = CompressWriter(writer, level, fmt, executor, chunk_size, stats,
+                         zdict, strategy)
+    chunk = await reader.read(chunk_size)
+    while len(chunk) > 0:
+        await out.write(chunk)
+        chunk = await reader.read(chunk_size)
+    await out.close()
+
+
+async def decompress_stream(reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter, fmt: str = 'defl',
+                            executor: Executor = None,
+                            chunk_size: int = CHUNK_SIZE, stats: Stats = None,
+                            zdict: bytes = None):
+    """ Decompresses everything from reader into writer
+    """
+    decompressed = DecompressReader(reader, fmt, executor, chunk_size, stats,
+                                    zdict)
+    part = await decompressed.read(chunk_size)
+    while len(part) > 0:
+        writer.write(part)
+        await writer.drain()
+        part = await decompressed.read(chunk_size)
@@ -0,0 +1,215 @@
+from concurrent.futures import ProcessPoolExecutor
+from deflate import defl_decode, defl_encode
+from lzss import DEFAULT_LEVEL
+import os
+
+# An archive starts with ARCHIVE_MAGIC, followed by the members, which
+# are independent defl streams, and the file table. Every entry of the
+# table is the length of the name as 2 bytes, the name in UTF-8 and
+# the uncompressed size, the offset and the compressed size of the member
+# as 8 bytes each. The archive ends with the offset of the table as 8 bytes,
+# the number of entries as 4 bytes and ARCHIVE_MAGIC.
+ARCHIVE_MAGIC = b'DFLA'
+FOOTER_SIZE = 16
+# the most files given to a worker at a time
+MAX_BATCH = 64
+
+
+def find_files(paths: list[str], suffix: str = '',
+               skip: tuple[str] = ()) -> list[str]:
+    """ Returns the files given in paths and the files ending with suffix
+        in the directory trees of paths, in a sorted order.
+        The files in the trees ending with any of skip are left out.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for (root, dirs, names) in os.walk(path):
+            dirs.sort()
+            files += [os.path.join(root, name) for name in sorted(names)
+                      if name.endswith(suffix)
+                      and not name.endswith(skip)]
+    return files
+
+
+def run_jobs(function, args: list[tuple], jobs: int = 1):
+    """ Calls function with each tuple of args and yields the results
+        in order. With more than one job, the calls are run by a pool of
+        worker processes, which are reused for all the calls, and small
+        batches of calls are given to a worker at a time.
+    """
+    if len(args) == 0:
+        return
+    if jobs <= 1:
+        yield from map(function, *zip(*args))
+        return
+    batch = max(1, min(MAX_BATCH, len(args) // (4*jobs)))
+    with ProcessPoolExecutor(jobs) as executor:
+        yield from executor.map(function, *zip(*args), chunksize=batch)
+
+
+def member_name(path: str) -> str:
+    """ Returns the name of a file in the archive: a relative path
+        with '/' as the separator.
+    """
+    parts = os.path.normpath(path).replace(os.sep, '/').split('/')
+    return '/'.join(part for part in parts if part not in ('', '.', '..'))
+
+
+def archive_members(paths: list[str],
+                    archive_name: str = None) -> list[(str, str)]:
+    """ Returns the files of paths and their names in the archive.
+        A file given more than once, eg. as 'a/x' and './a/x' or in
+        overlapping directories, is added once, and different files
+        which would get the same name are rejected. The archive itself
+        is left out, as it may be written inside the directories.
+    """
+    members = []
+    found = {}
+    archive_path = None
+    if archive_name is not None:
+        archive_path = os.path.realpath(archive_name)
+    for path in find_files(paths):
+        if os.path.realpath(path) == archive_path:
+            continue
+        name = member_name(path)
+        if name not in found:
+            found[name] = path
+            members.append((path, name))
+        elif not os.path.samefile(found[name], path):
+            e = f'Files {found[name]} and {path} have the same name {name}'
+            raise Exception(e)
+    return members
+
+
+def member_path(name: str, output_dir: str) -> str:
+    """ Returns where a member of the archive is extracted.
+        Names that would be outside output_dir are rejected.
+    """
+    parts = name.split('/')
+    if name.startswith('/') or '..' in parts or '' in parts:
+        e = f'Invalid name in the archive: {name}'
+        raise Exception(e)
+    return os.path.join(output_dir, *parts)
+
+
+def compress_member(path: str, level: int, zdict: bytes,
+                    strategy: str) -> (int, bytearray):
+    """ Compresses a file, returns its size and the compressed data
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return (len(data), defl_encode(data, level, zdict=zdict,
+                                   strategy=strategy))
+
+
+def extract_member(archive_name: str, offset: int, compressed_size: int,
+                   size: int, path: str, zdict: bytes):
+    """ Decompresses a member of the archive into the file path
+    """
+    with open(archive_name, 'rb') as f:
+        f.seek(offset)
+        data = defl_decode(f.read(compressed_size), zdict=zdict)
+    if len(data) != size:
+        e = f'Invalid size of {path}'
+        raise Exception(e)
+    directory = os.path.dirname(path)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def table_to_bytes(table: list[(str, int, int, int)],
+                   offset: int) -> bytearray:
+    """ Returns the file table and the footer of an archive
+    """
+    out = bytearray()
+    for (name, size, member_offset, compressed_size) in table:
+        encoded = name.encode('utf-8')
+        out += len(encoded).to_bytes(2, 'little') + encoded
+        out += size.to_bytes(8, 'little')
+        out += member_offset.to_bytes(8, 'little')
+        out += compressed_size.to_bytes(8, 'little')
+    out += offset.to_bytes(8, 'little')
+    out += len(table).to_bytes(4, 'little')
+    out += ARCHIVE_MAGIC
+    return out
+
+
+def read_table(f) -> list[(str, int, int, int)]:
+    """ Reads the file table of an archive: the name, the size,
+        the offset and the compressed size of every member
+    """
+    f.seek(0, 2)
+    end = f.tell() - FOOTER_SIZE
+    if end >= len(ARCHIVE_MAGIC):
+        f.seek(end)
+        footer = f.read(FOOTER_SIZE)
+    if end < len(ARCHIVE_MAGIC) or footer[12:] != ARCHIVE_MAGIC:
+        e = 'The file is not an archive'
+        raise Exception(e)
+    offset = int.from_bytes(footer[:8], 'little')
+    n = int.from_bytes(footer[8:12], 'little')
+    if offset > end:
+        e = 'Invalid offset of the file table'
+        raise Exception(e)
+    f.seek(offset)
+    data = f.read(end - offset)
+
+    table = []
+    pos = 0
+    for _ in range(0, n):
+        name_len = int.from_bytes(data[pos:pos+2], 'little')
+        name = data[pos+2:pos+2+name_len].decode('utf-8')
+        pos += 2 + name_len
+        (size, member_offset, compressed_size) = [
+            int.from_bytes(data[i:i+8], 'little')
+            for i in range(pos, pos + 24, 8)]
+        pos += 24
+        if pos > len(data) or member_offset + compressed_size > offset:
+            e = 'Invalid file table'
+            raise Exception(e)
+        table.append((name, size, member_offset, compressed_size))
+    return table
+
+
+def create_archive(paths: list[str], archive_name: str,
+                   level: int = DEFAULT_LEVEL, jobs: int = 1,
+                   zdict: bytes = None, strategy: str = 'auto') -> int:
+    """ Compresses the files and the directory trees of paths into
+        an archive. The files are compressed by jobs worker processes and
+        written into the archive in order. Returns the number of files.
+    """
+    members = archive_members(paths, archive_name)
+    table = []
+    with open(archive_name, 'wb') as out:
+        out.write(ARCHIVE_MAGIC)
+        offset = len(ARCHIVE_MAGIC)
+        results = run_jobs(compress_member,
+                           [(path, level, zdict, strategy)
+                            for (path, _) in members], jobs)
+        for ((_, name), (size, data)) in zip(members, results):
+            out.write(data)
+            table.append((name, size, offset, len(data)))
+            offset += len(data)
+        out.write(table_to_bytes(table, offset))
+    return len(members)
+
+
+def extract_archive(archive_name: str, output_dir: str = '.',
+                    jobs: int = 1, zdict: bytes = None) -> int:
+    """ Extracts the files of an archive under output_dir. The workers
+        read their members from the archive themselves.
+        Returns the number of files.
+    """
+    with open(archive_name, 'rb') as f:
+        table = read_table(f)
+    args = [(archive_name, offset, compressed_size, size,
+             member_path(name, output_dir), zdict)
+            for (name, size, offset, compressed_size) in table]
+    for _ in run_jobs(extract_member, args, jobs):
+        pass
+    return len(table)
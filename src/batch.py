@@ -0,0 +1,169 @@
+from zlib import adler32
+from deflate import WINDOW_SIZE, write_tokens
+from helpers import BitReader, BitWriter
+from huffman import (
+    canonical_huffcode, code_values, decode_table, limited_code_lens,
+    read_code, read_code_lens, rle
+)
+from lzss import DEFAULT_LEVEL, LZSSEncoder, LZSSTokens, append_match
+
+# Symbols which can occur in the tokens: the literals, the end of block
+# and the lengths 3-258 (bit lengths 2-9), and the distance codes of
+# distances 1-32768 (bit lengths 1-16)
+SYMBOLS = range(0, 265)
+DIST_CODES = range(1, 17)
+
+
+class SharedTable:
+    """ Huffman codes for the symbols and the distances, and an optional
+        preset dictionary, which are shared by many small records.
+        The records refer to the table with its id, the Adler-32 checksum
+        of the table, so the codes are not stored in every record.
+    """
+    def __init__(self, sym_lens: list[int], dist_lens: list[int],
+                 zdict: bytes = b''):
+        self.sym_lens = sym_lens
+        self.dist_lens = dist_lens
+        self.zdict = bytes(zdict[-WINDOW_SIZE:])
+        self.sym_codes = (sym_lens,
+                          code_values(canonical_huffcode(sym_lens)))
+        self.dist_codes = (dist_lens,
+                           code_values(canonical_huffcode(dist_lens)))
+        self.sym_table = decode_table(sym_lens)
+        self.dist_table = decode_table(dist_lens)
+        self.table_id = adler32(self.to_bytes())
+
+    def to_bytes(self) -> bytearray:
+        """ Returns the table as RLE encoded code lengths
+            followed by the dictionary.
+        """
+        return rle(self.sym_lens) + rle(self.dist_lens) + self.zdict
+
+
+def load_table(data: bytearray) -> SharedTable:
+    """ Loads a table saved with SharedTable.to_bytes
+    """
+    in_bits = BitReader(data)
+    sym_lens = read_code_lens(in_bits, 288)
+    dist_lens = read_code_lens(in_bits, 32)
+    return SharedTable(sym_lens, dist_lens, in_bits.read_bytes(len(data)))
+
+
+def encode_record(encoder: LZSSEncoder, record: bytearray) -> LZSSTokens:
+    """ Encodes a record with the history of encoder and leaves
+        the encoder as it was. Usually the positions of the record are
+        rolled back from the history, and a copy of the whole history
+        is only needed for records longer than the window.
+    """
+    state = encoder.checkpoint(len(record))
+    if state is None:
+        return encoder.copy().encode(record)
+    try:
+        return encoder.encode(record)
+    finally:
+        encoder.rollback(state)
+
+
+def train_table(samples: list[bytes], level: int = DEFAULT_LEVEL,
+                zdict: bytes = b'') -> SharedTable:
+    """ Builds a shared table from the symbol counts of sample records.
+        Every possible symbol gets a code, so the table can encode
+        any record, but the symbols of the samples get the shortest codes.
+    """
+    sym_counts = [0]*288
+    dist_counts = [0]*32
+    for sym in SYMBOLS:
+        sym_counts[sym] = 1
+    for code in DIST_CODES:
+        dist_counts[code] = 1
+
+    primed = LZSSEncoder(WINDOW_SIZE, level)
+    primed.prime(zdict)
+    for sample in samples:
+        tokens = encode_record(primed, sample)
+        for (length, value) in zip(tokens.lengths, tokens.values):
+            if length == 0:
+                sym_counts[value] += 1
+            else:
+                sym_counts[length.bit_length() + 255] += 1
+                dist_counts[value.bit_length()] += 1
+        sym_counts[256] += 1
+
+    return SharedTable(limited_code_lens(sym_counts),
+                       limited_code_lens(dist_counts), zdict)
+
+
+class BatchEncoder:
+    """ Compresses records with a shared table. Each record is the id of
+        the table followed by the Huffman coded tokens of the record,
+        without a block header.
+    """
+    def __init__(self, table: SharedTable, level: int = DEFAULT_LEVEL):
+        self.table = table
+        self.header = table.table_id.to_bytes(4, 'big')
+        # the dictionary is added to the history once,
+        # and every record is rolled back from it after encoding
+        self.encoder = LZSSEncoder(WINDOW_SIZE, level)
+        self.encoder.prime(table.zdict)
+
+    def encode(self, record: bytearray) -> bytearray:
+        out = BitWriter(len(record) + 8)
+        out.write_bytes(self.header)
+        tokens = encode_record(self.encoder, record)
+        write_tokens(tokens, self.table.sym_codes, self.table.dist_codes, out)
+        (sym_lens, sym_values) = self.table.sym_codes
+        out.write(sym_values[256], sym_lens[256])
+        return out.getvalue()
+
+
+class BatchDecoder:
+    """ Decompresses records compressed with BatchEncoder.
+        The tables are loaded once and looked up by the ids of the records.
+        Every table has a buffer starting with its dictionary, and
+        the records are decoded after the dictionary and then cut off,
+        so the dictionary is not copied for every record.
+    """
+    def __init__(self, tables: list[SharedTable] = ()):
+        self.tables = {}
+        self.buffers = {}
+        for table in tables:
+            self.add_table(table)
+
+    def add_table(self, table: SharedTable):
+        self.tables[table.table_id] = table
+        self.buffers[table.table_id] = bytearray(table.zdict)
+
+    def decode(self, data: bytearray) -> bytearray:
+        table_id = int.from_bytes(data[:4], 'big')
+        if table_id not in self.tables:
+            e = f'Unknown table {table_id:08x}'
+            raise Exception(e)
+        table = self.tables[table_id]
+
+        in_bits = BitReader(memoryview(data)[4:])
+        out = self.buffers[table_id]
+        start = len(table.zdict)
+        try:
+            self.decode_tokens(in_bits, table, out)
+            return out[start:]
+        finally:
+            del out[start:]
+
+    def decode_tokens(self, in_bits: BitReader, table: SharedTable,
+                      out: bytearray):
+        """ Decodes the tokens of a record to the end of out
+        """
+        sym_table = table.sym_table
+        dist_table = table.dist_table
+        code = read_code(in_bits, sym_table)
+        while code != 256:
+            if code < 256:
+                out.append(code)
+            else:
+                length = in_bits.read(code - 255)
+                dist = in_bits.read(read_code(in_bits, dist_table))
+                if dist == 0 or dist > len(out):
+                    e = f'Invalid distance {dist}'
+                    raise Exception(e)
+                append_match(out, length, dist)
+            code = read_code(in_bits, sym_table)
@@ -0,0 +1,2 @@
+from benchmark.corpus import KINDS, SIZES, generate
+from benchmark.runner import STAGES, environment, run_stage
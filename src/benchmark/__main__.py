@@ -0,0 +1,64 @@
+from benchmark.corpus import KINDS, SIZES, generate
+from benchmark.runner import STAGES, environment, run_stage
+import argparse
+import json
+import sys
+
+
+def parse_size(s: str) -> int:
+    """ Parses sizes like 1000, 10K or 100M (powers of ten)
+    """
+    units = {'K': 10**3, 'M': 10**6, 'G': 10**9}
+    if s[-1:].upper() in units:
+        return int(s[:-1]) * units[s[-1].upper()]
+    return int(s)
+
+
+def parse_args(l: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES),
+                        default=list(STAGES),
+                        help='the stages to run (default: all)')
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS,
+                        help='the kinds of data to use (default: all)')
+    parser.add_argument('--max-size', type=parse_size, default=10**6,
+                        help='the largest input size, eg. 100M for the full '
+                        'curve from 1 KB to 100 MB (default: 1M)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='the seed of the generated data (default: 0)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='do not measure the peak memory, which runs '
+                        'every stage a second time')
+    parser.add_argument('-o', dest='output',
+                        help='the name of the JSON file for the results '
+                        '(default: standard output)')
+    return parser.parse_args(l[1:])
+
+
+def main(l: list):
+    args = parse_args(l)
+    results = []
+    for kind in args.kinds:
+        for size in [s for s in SIZES if s <= args.max_size]:
+            data = generate(kind, size, args.seed)
+            for stage in args.stages:
+                result = {'kind': kind,
+                          **run_stage(stage, data, args.memory)}
+                results.append(result)
+                print(f'{kind:>10} {size:>10} {stage:>8} '
+                      f'ratio {result["ratio"]:7.2f} '
+                      f'encode {result["encode_mb_s"]:8.3f} MB/s '
+                      f'decode {result["decode_mb_s"]:8.3f} MB/s',
+                      file=sys.stderr)
+
+    report = json.dumps({'environment': environment(), 'seed': args.seed,
+                         'results': results}, indent=2)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,70 @@
+from random import Random
+from struct import pack
+
+# Sizes of the benchmark inputs from 1 KB to 100 MB
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7, 10**8]
+KINDS = ['text', 'random', 'repetitive', 'binary']
+
+
+def text_data(rng: Random, size: int) -> bytearray:
+    """ Generates text of words whose frequencies follow Zipf's law
+    """
+    letters = 'etaoinshrdlcumwfgypbvkjxqz'
+    words = [''.join(rng.choices(letters, k=rng.randint(1, 10))).encode()
+             for i in range(0, 2000)]
+    weights = [1/rank for rank in range(1, len(words) + 1)]
+    out = bytearray()
+    while len(out) < size:
+        line = b' '.join(rng.choices(words, weights, k=12))
+        out += line[:1].upper() + line[1:] + b'.\n'
+    return out[:size]
+
+
+def random_data(rng: Random, size: int) -> bytearray:
+    """ Generates uniformly random bytes, which can not be compressed
+    """
+    return bytearray(rng.randbytes(size))
+
+
+def repetitive_data(rng: Random, size: int) -> bytearray:
+    """ Generates a short pattern repeated over and over
+        with a mutation now and then.
+    """
+    pattern = bytearray(rng.randbytes(50))
+    out = bytearray()
+    while len(out) < size:
+        out += pattern
+        if rng.random() < 0.05:
+            pattern[rng.randrange(len(pattern))] = rng.randrange(256)
+    return out[:size]
+
+
+def binary_data(rng: Random, size: int) -> bytearray:
+    """ Generates fixed-size records of counters, small integers and
+        floating point numbers, like a binary log or a table.
+    """
+    out = bytearray()
+    i = 0
+    while len(out) < size:
+        out += pack('<IHhd', i, rng.randrange(16), rng.randint(-300, 300),
+                    rng.gauss(100, 15))
+        i += 1
+    return out[:size]
+
+
+GENERATORS = {
+    'text': text_data,
+    'random': random_data,
+    'repetitive': repetitive_data,
+    'binary': binary_data
+}
+
+
+def generate(kind: str, size: int, seed: int = 0) -> bytearray:
+    """ Generates size bytes of the given kind of data.
+        The same seed always gives the same data.
+    """
+    if kind not in GENERATORS:
+        e = f'Unknown kind of data {kind}'
+        raise Exception(e)
+    return GENERATORS[kind](Random(f'{kind}-{seed}'), size)
@@ -0,0 +1,84 @@
+from time import perf_counter
+import platform
+import tracemalloc
+import zlib
+from deflate import defl_decode, defl_encode
+from huffman import huff_decode, huff_encode
+from lzss import lzss_decode, lzss_encode
+import npbackend
+
+# (encode, decode) functions of every stage,
+# zlib is the baseline the others are compared to
+STAGES = {
+    'deflate': (defl_encode, defl_decode),
+    'huffman': (huff_encode, huff_decode),
+    'lzss': (lzss_encode, lzss_decode),
+    'zlib': (zlib.compress, zlib.decompress)
+}
+
+
+def measure_time(f, data: bytearray) -> (object, float):
+    """ Returns the result of f(data) and the time it took in seconds
+    """
+    start = perf_counter()
+    result = f(data)
+    return (result, perf_counter() - start)
+
+
+def measure_memory(f, data: bytearray) -> int:
+    """ Returns the peak memory allocated while calling f(data) in bytes.
+        The tracing slows down the call, so it is measured separately
+        from the time.
+    """
+    tracemalloc.start()
+    try:
+        f(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def throughput(size: int, seconds: float) -> float:
+    """ Returns the speed in MB/s
+    """
+    return size / 10**6 / max(seconds, 1e-9)
+
+
+def run_stage(stage: str, data: bytearray, memory: bool = True) -> dict:
+    """ Compresses and decompresses data with a stage and checks that
+        the data is unchanged. Returns the measurements.
+    """
+    (encode, decode) = STAGES[stage]
+    (compressed, encode_time) = measure_time(encode, data)
+    (decompressed, decode_time) = measure_time(decode, compressed)
+    if decompressed != data:
+        e = f'{stage} did not decompress the data correctly'
+        raise Exception(e)
+
+    result = {
+        'stage': stage,
+        'size': len(data),
+        'compressed_size': len(compressed),
+        'ratio': len(data) / max(len(compressed), 1),
+        'encode_seconds': encode_time,
+        'decode_seconds': decode_time,
+        'encode_mb_s': throughput(len(data), encode_time),
+        'decode_mb_s': throughput(len(data), decode_time)
+    }
+    if memory:
+        result['encode_peak_bytes'] = measure_memory(encode, data)
+        result['decode_peak_bytes'] = measure_memory(decode, compressed)
+    return result
+
+
+def environment() -> dict:
+    """ Returns information about the machine for comparing the results
+    """
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'zlib': zlib.ZLIB_RUNTIME_VERSION,
+        'numpy': None if npbackend.np is None else npbackend.np.__version__
+    }
@@ -0,0 +1,57 @@
+# An index is a list of (uncompressed offset, compressed offset) entries
+# of 8 bytes each, followed by the number of entries as 4 bytes and
+# the magic bytes. The last entry is the end of the data and of the blocks.
+# SYNC_MAGIC means that the entries are sync points where the history is
+# empty, BLOCK_MAGIC that the entries are blocks which can refer to
+# the previous WINDOW_SIZE bytes of data.
+SYNC_MAGIC = b'DFLX'
+BLOCK_MAGIC = b'DFLB'
+ENTRY_SIZE = 16
+FOOTER_SIZE = 8
+
+
+def index_to_bytes(index: list[(int, int)],
+                   magic: bytes = SYNC_MAGIC) -> bytearray:
+    """ Returns the index and its footer as bytes
+    """
+    out = bytearray()
+    for (in_offset, out_offset) in index:
+        out += in_offset.to_bytes(8, 'little')
+        out += out_offset.to_bytes(8, 'little')
+    out += len(index).to_bytes(4, 'little')
+    out += magic
+    return out
+
+
+def has_index(f) -> bool:
+    """ Returns whether a file ends with an index
+    """
+    f.seek(0, 2)
+    if f.tell() < FOOTER_SIZE:
+        return False
+    f.seek(f.tell() - FOOTER_SIZE)
+    return f.read(FOOTER_SIZE)[4:] in (SYNC_MAGIC, BLOCK_MAGIC)
+
+
+def read_index(f) -> (list[(int, int)], bool):
+    """ Reads the index from the end of a file. Returns the entries
+        and whether they are sync points.
+    """
+    f.seek(0, 2)
+    size = f.tell()
+    if size >= FOOTER_SIZE:
+        f.seek(size - FOOTER_SIZE)
+        footer = f.read(FOOTER_SIZE)
+    if size < FOOTER_SIZE or footer[4:] not in (SYNC_MAGIC, BLOCK_MAGIC):
+        e = 'The file has no index'
+        raise Exception(e)
+    n = int.from_bytes(footer[:4], 'little')
+    if n * ENTRY_SIZE > size - FOOTER_SIZE:
+        e = f'Invalid number of index entries {n}'
+        raise Exception(e)
+    f.seek(size - FOOTER_SIZE - n * ENTRY_SIZE)
+    data = f.read(n * ENTRY_SIZE)
+    index = [(int.from_bytes(data[i:i+8], 'little'),
+              int.from_bytes(data[i+8:i+16], 'little'))
+             for i in range(0, len(data), ENTRY_SIZE)]
+    return (index, footer[4:] == SYNC_MAGIC)
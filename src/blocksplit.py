@@ -0,0 +1,87 @@
+from math import log2
+
+# Histograms are collected for segments of this many tokens,
+# and the blocks are split only at the segment boundaries.
+SEGMENT_TOKENS = 1024
+
+
+def histogram(syms: list[int], n_syms: int, start: int, end: int) -> list[int]:
+    """ Counts the symbols from start to end, negative symbols are skipped
+    """
+    counts = [0]*n_syms
+    for sym in syms[start:end]:
+        if sym >= 0:
+            counts[sym] += 1
+    return counts
+
+
+def entropy_bits(counts: list[int]) -> float:
+    """ Estimates the number of bits needed to encode the symbols with
+        an optimal code. Huffman codes are within a bit per symbol of this.
+    """
+    total = sum(counts)
+    return sum(c * log2(total / c) for c in counts if c > 0)
+
+
+class BlockCost:
+    """ The estimated size in bits of a block with the given histograms:
+        the symbols and the header, which stores a code length
+        for every used symbol.
+    """
+    def __init__(self, lit_counts: list[int], dist_counts: list[int],
+                 header_bits: (float, float)):
+        self.lit_counts = lit_counts
+        self.dist_counts = dist_counts
+        self.header_bits = header_bits
+        self.bits = self.estimate()
+
+    def estimate(self) -> float:
+        (block_bits, symbol_bits) = self.header_bits
+        used = len(self.lit_counts) - self.lit_counts.count(0) + \
+            len(self.dist_counts) - self.dist_counts.count(0)
+        return block_bits + symbol_bits * used + \
+            entropy_bits(self.lit_counts) + entropy_bits(self.dist_counts)
+
+    def join(self, other: 'BlockCost') -> 'BlockCost':
+        """ Returns the cost of a block with the symbols of both blocks
+        """
+        return BlockCost([a + b for (a, b)
+                          in zip(self.lit_counts, other.lit_counts)],
+                         [a + b for (a, b)
+                          in zip(self.dist_counts, other.dist_counts)],
+                         self.header_bits)
+
+
+def split_points(lit_syms: list[int], dist_syms: list[int],
+                 alphabet: (int, int), header_bits: (float, float),
+                 segment: int = SEGMENT_TOKENS) -> list[int]:
+    """ Chooses where the tokens are split into blocks with their own
+        Huffman codes. lit_syms and dist_syms are the literal/length and
+        distance symbols of the tokens (distance -1 for literals),
+        alphabet has the numbers of the symbols and header_bits the cost
+        of a block header as (bits per block, bits per used symbol).
+        The segments of tokens are added to the current block until
+        the estimated cost of a new block is lower than continuing.
+        Returns the indices of the tokens where the blocks end.
+    """
+    (n_lit, n_dist) = alphabet
+    n = len(lit_syms)
+    ends = []
+    block = None
+    for start in range(0, n, segment):
+        end = min(start + segment, n)
+        part = BlockCost(histogram(lit_syms, n_lit, start, end),
+                         histogram(dist_syms, n_dist, start, end),
+                         header_bits)
+        if block is None:
+            block = part
+            continue
+        joined = block.join(part)
+        if block.bits + part.bits < joined.bits:
+            ends.append(start)
+            block = part
+        else:
+            block = joined
+
+    ends.append(n)
+    return ends
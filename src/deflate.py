@@ -1,96 +1,724 @@
 from collections import deque
-from huffman import get_codes, read_code, read_code_dict, append_vals, rle
-from lzss import to_lzss, LZSSNode, lzss_to_decrypted
-from helpers import bits_to_int, clear_buf, int_to_min_bits, read_to_buf
+from concurrent.futures import ProcessPoolExecutor
+from huffman import (
+    canonical_huffcode, code_values, counts, limited_code_lens, read_code,
+    read_code_table, rle
+)
+from lzss import LZSSEncoder, LZSSTokens, append_match, DEFAULT_LEVEL
+from helpers import BitReader, BitWriter, EndOfData
+from rfc1951 import (
+    DIST_BASE, DIST_EXTRA, LENGTH_BASE, LENGTH_EXTRA, container_header,
+    container_trailer, initial_checksum, read_container_header,
+    read_container_trailer, update_checksum
+)
+from stats import Stats, timer
+from blocksplit import split_points
+from blockindex import BLOCK_MAGIC, index_to_bytes
+from strategy import check_strategy, choose_strategy
+import rfc1951
 
+WINDOW_SIZE = 2**15
+BLOCK_SIZE = 2**16
 
-def write_node_to_buf(in_nodes: list[LZSSNode],
-                      sym_codes: list[list[int]], dist_codes: list[list[int]],
-                      out: bytearray, out_buf: deque[int]):
-    """ Puts an LZSS node into buffer.
+# Every block starts with a header byte: the lowest bit tells
+# whether the block is the last one and the other bits are the block type.
+# A stored block has the length of its data as 4 bytes after the header byte.
+BLOCK_HUFFMAN = 0
+BLOCK_STORED = 1
+
+# the estimated cost of a block header in bits
+# as (bits per block, bits per used symbol)
+HEADER_BITS = (40, 10)
+
+# 'defl' is the format of this project, 'raw' is RFC 1951 Deflate
+# and 'zlib' and 'gzip' wrap it in the RFC 1950 and RFC 1952 containers.
+FORMATS = ['defl', 'raw', 'zlib', 'gzip']
+
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        e = f'Unknown format {fmt}'
+        raise Exception(e)
+
+
+def write_tokens(tokens: LZSSTokens, sym_codes: (list[int], list[int]),
+                 dist_codes: (list[int], list[int]), out: BitWriter):
+    """ Writes LZSS tokens using the given
+        (code lengths, code values) pairs.
     """
-    node = in_nodes.popleft()
-    append_vals(out_buf, sym_codes[node.defl_sym()])
-    if not node.is_literal():
-        append_vals(out_buf, int_to_min_bits(node.length))
-        append_vals(out_buf, dist_codes[node.defl_dist()])
-        append_vals(out_buf, int_to_min_bits(node.dist))
+    (sym_lens, sym_values) = sym_codes
+    (dist_lens, dist_values) = dist_codes
+    for (length, value) in zip(tokens.lengths, tokens.values):
+        if length == 0:
+            out.write(sym_values[value], sym_lens[value])
+        else:
+            length_bits = length.bit_length()
+            sym = length_bits + 255
+            out.write(sym_values[sym], sym_lens[sym])
+            out.write(length, length_bits)
+            dist_bits = value.bit_length()
+            out.write(dist_values[dist_bits], dist_lens[dist_bits])
+            out.write(value, dist_bits)
 
 
-def defl_encode(input_bytes: bytearray) -> bytearray:
-    """ Encodes the data using Deflate-algorithm
+def token_symbols(tokens: LZSSTokens) -> (list[int], list[int]):
+    """ Returns the symbols and the distance codes of the tokens.
+        The distance code of a literal is -1.
     """
-    in_nodes = to_lzss(input_bytes, 2**15)
-    in_nodes.append(LZSSNode(char=256))
-    sym_values = [node.defl_sym() for node in in_nodes]
+    sym_values = [value if length == 0 else length.bit_length() + 255
+                  for (length, value) in zip(tokens.lengths, tokens.values)]
+    dist_values = [-1 if length == 0 else value.bit_length()
+                   for (length, value) in zip(tokens.lengths, tokens.values)]
+    return (sym_values, dist_values)
 
-    (sym_code_lens, sym_codes) = get_codes(sym_values, 288)
 
-    dist_values = [d.defl_dist() for d in in_nodes if not d.is_literal()]
-    (dist_code_lens, dist_codes) = get_codes(dist_values, 32)
+def write_block(tokens: LZSSTokens, out: BitWriter, final: bool,
+                stats: Stats = None):
+    """ Writes LZSS tokens as a block with its own Huffman codes.
+        The block ends at a byte boundary.
+    """
+    with timer(stats, 'huffman'):
+        (sym_values, dist_values) = token_symbols(tokens)
+        sym_values.append(256)
+        sym_code_lens = limited_code_lens(counts(sym_values, 288))
+        dist_values = [value for value in dist_values if value >= 0]
+        dist_code_lens = limited_code_lens(counts(dist_values, 32))
 
-    out = bytearray()
+    with timer(stats, 'canonical'):
+        sym_codes = (sym_code_lens,
+                     code_values(canonical_huffcode(sym_code_lens)))
+        dist_codes = (dist_code_lens,
+                      code_values(canonical_huffcode(dist_code_lens)))
 
-    # add rle bitlengths
-    out += rle(sym_code_lens)
-    out += rle(dist_code_lens)
+    start = out.bit_pos()
+    with timer(stats, 'header'):
+        out.write_bytes(bytes([BLOCK_HUFFMAN*2 + final]))
+        # add rle bitlengths
+        out.write_bytes(rle(sym_code_lens))
+        out.write_bytes(rle(dist_code_lens))
+    header_end = out.bit_pos()
 
     # add input data
-    out_buf = deque([])
-    while len(in_nodes) > 0:
-        write_node_to_buf(in_nodes, sym_codes, dist_codes, out, out_buf)
-        clear_buf(out, out_buf, 7)
+    with timer(stats, 'bits'):
+        write_tokens(tokens, sym_codes, dist_codes, out)
+        out.write(sym_codes[1][256], sym_code_lens[256])
+        out.align()
 
-    # add rest of the buffer
-    clear_buf(out, out_buf, 0)
+    if stats is not None:
+        stats.blocks += 1
+        stats.header_bits += header_end - start
+        stats.payload_bits += out.bit_pos() - header_end
 
-    return out
+
+def write_blocks(tokens: LZSSTokens, out: BitWriter, final: bool,
+                 fmt: str = 'defl', stats: Stats = None):
+    """ Splits the tokens into blocks where the statistics of the symbols
+        change enough to pay for a new Huffman code, and writes the blocks
+        in the format.
+    """
+    with timer(stats, 'split'):
+        if fmt == 'defl':
+            (lit_syms, dist_syms) = token_symbols(tokens)
+            ends = split_points(lit_syms, dist_syms, (288, 32), HEADER_BITS)
+        else:
+            (lit_syms, dist_syms) = rfc1951.token_symbols(tokens)
+            ends = split_points(lit_syms, dist_syms, (286, 30),
+                                rfc1951.HEADER_BITS)
+
+    write = write_block if fmt == 'defl' else rfc1951.write_block
+    start = 0
+    for end in ends:
+        write(tokens.slice(start, end), out, final and end == ends[-1],
+              stats)
+        start = end
+
+
+def write_stored(data: bytearray, out: BitWriter, final: bool,
+                 fmt: str = 'defl', stats: Stats = None):
+    """ Writes data as it is in stored blocks of the format
+    """
+    if fmt != 'defl':
+        rfc1951.write_stored(data, out, final, stats)
+        return
+
+    start = out.bit_pos()
+    out.write_bytes(bytes([BLOCK_STORED*2 + final]))
+    out.write_bytes(len(data).to_bytes(4, 'little'))
+    header_end = out.bit_pos()
+    out.write_bytes(data)
+    if stats is not None:
+        stats.blocks += 1
+        stats.header_bits += header_end - start
+        stats.payload_bits += out.bit_pos() - header_end
+
+
+def encode_block(encoder: LZSSEncoder, block: bytearray, flush: bool,
+                 stats: Stats = None, strategy: str = 'lzss') -> LZSSTokens:
+    """ Transforms a block into LZSS tokens with the encoder
+        using the strategy and adds the tokens to the statistics.
+    """
+    if strategy == 'huffman':
+        encode = encoder.encode_literals
+    elif strategy == 'rle':
+        encode = encoder.encode_runs
+    else:
+        def encode(block: bytearray) -> LZSSTokens:
+            return encoder.encode(block, flush)
+
+    if stats is None:
+        return encode(block)
+    stats.input_bytes += len(block)
+    probes = encoder.probes()
+    with stats.timer('lzss'):
+        tokens = encode(block)
+    stats.probes += encoder.probes() - probes
+    stats.count_tokens(tokens)
+    return tokens
 
 
-def parse_ref(out: deque[LZSSNode], code: int, dist_codes: dict[str, int],
-              in_vals: deque[int], in_buf: deque[str]):
-    """ Parses an LZSS reference and appens it to output as LZSS node.
+def write_input(encoder: LZSSEncoder, block: bytearray, out: BitWriter,
+                flush: bool, final: bool, fmt: str = 'defl',
+                strategy: str = 'auto', stats: Stats = None):
+    """ Compresses a block of input with one of STRATEGIES
+        and writes it to out in the format.
     """
-    # parse sym
-    sym_bits = code - 255
-    read_to_buf(in_vals, in_buf, sym_bits)
-    length = []
-    for i in range(0, sym_bits):
-        length.append(int(in_buf.popleft()))
-    # parse dist
-    dist_bits = read_code(in_vals, in_buf, dist_codes)
-    read_to_buf(in_vals, in_buf, dist_bits)
-    dist = []
-    for i in range(0, dist_bits):
-        dist.append(int(in_buf.popleft()))
-    out.append(LZSSNode(length=bits_to_int(length),
-                        dist=bits_to_int(dist)))
+    if strategy == 'auto':
+        with timer(stats, 'detect'):
+            strategy = choose_strategy(block, encoder.history(),
+                                       encoder.buffer_size)
+    if stats is not None:
+        stats.strategies[strategy] = stats.strategies.get(strategy, 0) + 1
+
+    if strategy == 'stored':
+        if stats is not None:
+            stats.input_bytes += len(block)
+        write_stored(encoder.skip(block), out, final, fmt, stats)
+    else:
+        tokens = encode_block(encoder, block, flush, stats, strategy)
+        write_blocks(tokens, out, final, fmt, stats)
+
+
+class Compressor:
+    """ Compresses data given in chunks. Every block_size bytes of input
+        are written as an independent Huffman block, but the LZSS history
+        is kept across the blocks. The memory usage depends only on
+        the block size, not on the length of the data.
+        The output is in one of FORMATS. If stats is given,
+        the statistics of the compression are collected into it.
+        The window can be primed with a preset dictionary zdict,
+        which is then needed for decompression. The strategy is one of
+        STRATEGIES, by default it is chosen for every block.
+    """
+    def __init__(self, level: int = DEFAULT_LEVEL,
+                 block_size: int = BLOCK_SIZE, fmt: str = 'defl',
+                 stats: Stats = None, zdict: bytes = None,
+                 strategy: str = 'auto'):
+        check_format(fmt)
+        check_strategy(strategy)
+        self.stats = stats
+        self.strategy = strategy
+        self.level = level
+        self.encoder = LZSSEncoder(WINDOW_SIZE, level)
+        if zdict is not None:
+            self.encoder.prime(zdict)
+        self.block_size = block_size
+        self.fmt = fmt
+        self.out = BitWriter()
+        self.out.write_bytes(container_header(fmt, level, zdict))
+        self.checksum = initial_checksum(fmt)
+        self.size = 0
+        self.pending = bytearray()
+        self.finished = False
+
+    def compress(self, chunk: bytearray) -> bytearray:
+        """ Compresses a chunk of data. Returns the compressed blocks
+            that are ready, the rest of the data is kept for later calls.
+        """
+        if self.finished:
+            e = 'Compressor has already been flushed'
+            raise Exception(e)
+        self.pending += chunk
+        self.checksum = update_checksum(self.fmt, self.checksum, chunk)
+        self.size += len(chunk)
+        while len(self.pending) >= self.block_size:
+            block = self.pending[:self.block_size]
+            del self.pending[:self.block_size]
+            write_input(self.encoder, block, self.out, False, False,
+                        self.fmt, self.strategy, self.stats)
+
+        # RFC 1951 blocks are not byte aligned,
+        # so the last bits are kept until the next block
+        return self.count_output(self.out.take())
+
+    def sync(self) -> bytearray:
+        """ Compresses the pending data and starts a new history, so that
+            the data after this point can be decompressed without the data
+            before it. The history is empty after the sync point, because
+            the decompression of the whole stream cannot know that
+            it should start again from the preset dictionary.
+            Returns the compressed data, which ends at a block boundary.
+            Only the defl format has byte aligned blocks.
+        """
+        if self.fmt != 'defl':
+            e = f'Sync points are not supported for {self.fmt}'
+            raise Exception(e)
+        if self.finished:
+            e = 'Compressor has already been flushed'
+            raise Exception(e)
+        write_input(self.encoder, self.pending, self.out, True, False,
+                    self.fmt, self.strategy, self.stats)
+        self.pending = bytearray()
+        self.encoder = LZSSEncoder(WINDOW_SIZE, self.level)
+        return self.count_output(self.out.take())
+
+    def count_output(self, out: bytearray) -> bytearray:
+        """ Adds the compressed data to the statistics
+        """
+        if self.stats is not None:
+            self.stats.output_bytes += len(out)
+        return out
+
+    def flush(self) -> bytearray:
+        """ Compresses the rest of the data and ends the stream
+            with the last block and the trailer of the container.
+        """
+        write_input(self.encoder, self.pending, self.out, True, True,
+                    self.fmt, self.strategy, self.stats)
+        self.out.write_bytes(
+            container_trailer(self.fmt, self.checksum, self.size))
+        self.pending = bytearray()
+        self.finished = True
+        return self.count_output(self.out.getvalue())
+
+
+def compress_block(block: bytes, dictionary: bytes, level: int,
+                   final: bool, stats: Stats = None,
+                   strategy: str = 'auto') -> (bytearray, Stats):
+    """ Compresses one block independently of the others.
+        The LZSS window is primed with dictionary, which should be
+        the data before the block, so the block can refer to it.
+        Returns the compressed block and the statistics of the block,
+        if stats were given.
+    """
+    encoder = LZSSEncoder(WINDOW_SIZE, level)
+    encoder.prime(dictionary)
+    out = BitWriter()
+    write_input(encoder, block, out, True, final, 'defl', strategy, stats)
+    out = out.getvalue()
+    if stats is not None:
+        stats.output_bytes += len(out)
+    return (out, stats)
+
+
+class ParallelCompressor:
+    """ Compresses data given in chunks like Compressor, but the blocks
+        are compressed in parallel by a pool of worker processes.
+        Every block gets the previous WINDOW_SIZE bytes of input as
+        a dictionary, and the compressed blocks are returned in order,
+        so the output is a single valid stream. The statistics of
+        the workers are added to stats, so the times are the total
+        times of all the workers. The first block gets the preset
+        dictionary zdict, if it is given. If index is true, the stream
+        ends with an index of the blocks, so that they can be
+        decompressed in parallel as well.
+    """
+    def __init__(self, level: int = DEFAULT_LEVEL,
+                 block_size: int = BLOCK_SIZE, jobs: int = 2,
+                 stats: Stats = None, zdict: bytes = None,
+                 strategy: str = 'auto', index: bool = False):
+        check_strategy(strategy)
+        self.stats = stats
+        self.strategy = strategy
+        # (uncompressed offset, compressed offset) of every block
+        self.index = [] if index else None
+        self.in_size = 0
+        self.out_size = 0
+        self.level = level
+        self.block_size = block_size
+        self.jobs = jobs
+        self.executor = ProcessPoolExecutor(jobs)
+        self.pending = bytearray()
+        self.dictionary = b'' if zdict is None \
+            else bytes(zdict[-WINDOW_SIZE:])
+        self.futures = deque()
+        self.finished = False
+
+    def submit(self, block: bytes, final: bool):
+        """ Gives a block to the workers
+        """
+        stats = None if self.stats is None else Stats()
+        self.futures.append((self.in_size, self.executor.submit(
+            compress_block, block, self.dictionary, self.level, final,
+            stats, self.strategy)))
+        self.in_size += len(block)
+        self.dictionary = (self.dictionary + block)[-WINDOW_SIZE:]
+
+    def collect(self, max_running: int) -> bytearray:
+        """ Returns the blocks that are ready, in order. Waits for
+            the oldest blocks until at most max_running are unfinished.
+        """
+        out = bytearray()
+        while len(self.futures) > 0 and \
+                (self.futures[0][1].done() or
+                 len(self.futures) > max_running):
+            (in_offset, future) = self.futures.popleft()
+            (block, stats) = future.result()
+            if self.index is not None:
+                self.index.append((in_offset, self.out_size))
+            self.out_size += len(block)
+            out += block
+            if stats is not None:
+                self.stats.merge(stats)
+        return out
+
+    def compress(self, chunk: bytearray) -> bytearray:
+        """ Compresses a chunk of data. Returns the compressed blocks
+            that are ready, the rest of the data is kept for later calls.
+        """
+        if self.finished:
+            e = 'Compressor has already been flushed'
+            raise Exception(e)
+        self.pending += chunk
+        out = bytearray()
+        # the last block is left for flush, which marks it as the last one
+        while len(self.pending) > self.block_size:
+            self.submit(bytes(self.pending[:self.block_size]), False)
+            del self.pending[:self.block_size]
+            # limit the amount of data waiting for the workers
+            out += self.collect(2*self.jobs)
+
+        return out
+
+    def flush(self) -> bytearray:
+        """ Compresses the rest of the data, ends the stream
+            with the last block and the index and stops the workers.
+        """
+        self.submit(bytes(self.pending), True)
+        self.pending = bytearray()
+        self.finished = True
+        out = self.collect(0)
+        self.executor.shutdown()
+        if self.index is not None:
+            self.index.append((self.in_size, self.out_size))
+            out += index_to_bytes(self.index, BLOCK_MAGIC)
+        return out
 
 
-def defl_parse(in_arr: bytearray) -> deque[LZSSNode]:
-    """ Parses a deque of LZSS nodes out of input array
+def defl_encode(input_bytes: bytearray, level: int = DEFAULT_LEVEL,
+                block_size: int = BLOCK_SIZE, jobs: int = 1,
+                fmt: str = 'defl', stats: Stats = None,
+                zdict: bytes = None, strategy: str = 'auto') -> bytearray:
+    """ Encodes the data using Deflate-algorithm.
+        The level (1-9) trades speed for compression ratio.
+        With more than one job, the blocks are compressed in parallel.
+        The format is one of FORMATS. If stats is given,
+        the statistics of the compression are collected into it.
+        With a preset dictionary zdict, the data can refer to the
+        dictionary, which helps with small inputs. The same dictionary
+        has to be given for decoding. The strategy is one of STRATEGIES.
     """
-    in_vals = deque(in_arr)
+    if jobs > 1:
+        if fmt != 'defl':
+            e = f'Parallel compression is not supported for {fmt}'
+            raise Exception(e)
+        compressor = ParallelCompressor(level, block_size, jobs, stats,
+                                        zdict, strategy)
+    else:
+        compressor = Compressor(level, block_size, fmt, stats, zdict,
+                                strategy)
+    return compressor.compress(input_bytes) + compressor.flush()
 
-    sym_codes = read_code_dict(in_vals, 288)
-    dist_codes = read_code_dict(in_vals, 32)
 
-    out = deque([])
-    in_buf = deque([])
-    code = read_code(in_vals, in_buf, sym_codes)
+def parse_ref(out: LZSSTokens, code: int, dist_table: (int, list),
+              in_bits: BitReader):
+    """ Parses an LZSS reference and appens it to output as LZSS token.
+    """
+    length = in_bits.read(code - 255)
+    dist_bits = read_code(in_bits, dist_table)
+    dist = in_bits.read(dist_bits)
+    out.add_match(length, dist)
+
+
+def parse_header(in_bits: BitReader) -> (bool, int):
+    """ Parses the header byte of a block.
+        Returns whether the block is the last one and the block type.
+    """
+    header = in_bits.read(8)
+    if header >> 1 not in (BLOCK_HUFFMAN, BLOCK_STORED):
+        e = f'Unknown block type {header >> 1}'
+        raise Exception(e)
+    return (header & 1 == 1, header >> 1)
+
+
+def parse_block(in_bits: BitReader, out: LZSSTokens) -> bool:
+    """ Parses the LZSS tokens of one block into out.
+        The data of a stored block becomes literals.
+        Returns whether the block was the last one.
+    """
+    (final, block_type) = parse_header(in_bits)
+    if block_type == BLOCK_STORED:
+        length = int.from_bytes(in_bits.read_bytes(4), 'little')
+        data = in_bits.read_bytes(length)
+        if len(data) < length:
+            e = 'Unexpected end of data'
+            raise Exception(e)
+        out.add_literals(data)
+        return final
+
+    sym_table = read_code_table(in_bits, 288)
+    dist_table = read_code_table(in_bits, 32)
+
+    code = read_code(in_bits, sym_table)
     while code != 256:
         if code < 256:
-            out.append(LZSSNode(char=code))
+            out.add_literal(code)
         else:
-            parse_ref(out, code, dist_codes, in_vals, in_buf)
+            parse_ref(out, code, dist_table, in_bits)
+
+        code = read_code(in_bits, sym_table)
 
-        code = read_code(in_vals, in_buf, sym_codes)
+    in_bits.align()
+    return final
+
+
+def parse_blocks(in_arr: bytearray) -> LZSSTokens:
+    """ Parses the LZSS tokens of whole blocks until the last block
+        or the end of the input array.
+    """
+    in_bits = BitReader(in_arr)
+    out = LZSSTokens()
+    while in_bits.bit_pos() < 8*len(in_arr):
+        if parse_block(in_bits, out):
+            break
 
     return out
 
 
-def defl_decode(in_arr: bytearray) -> bytearray:
-    """ Decodes data that was compressed using Deflate-algorithm
+def defl_parse(in_arr: bytearray) -> LZSSTokens:
+    """ Parses LZSS tokens out of input array
+    """
+    in_bits = BitReader(in_arr)
+    out = LZSSTokens()
+    while not parse_block(in_bits, out):
+        pass
+
+    return out
+
+
+class Decompressor:
+    """ Decompresses data given in chunks of any size and returns
+        the decompressed data as soon as it is available.
+        Only the last WINDOW_SIZE bytes of the output are kept
+        for the references. The input is in one of FORMATS. If stats is
+        given, the statistics of the decompression are collected into it.
+        zdict is the preset dictionary the data was compressed with.
     """
-    return lzss_to_decrypted(defl_parse(in_arr))
+    def __init__(self, fmt: str = 'defl', stats: Stats = None,
+                 zdict: bytes = None):
+        check_format(fmt)
+        self.fmt = fmt
+        self.stats = stats
+        self.zdict = zdict
+        self.in_bits = BitReader(bytearray())
+        self.header_read = False
+        # (final, sym_table, dist_table) of the current Huffman block
+        # or (final, None, bytes left) of a stored block
+        self.block = None
+        self.blocks_done = False
+        # the dictionary is history that is not part of the output
+        self.window = bytearray() if zdict is None \
+            else bytearray(zdict[-WINDOW_SIZE:])
+        self.checksum = initial_checksum(fmt)
+        self.size = 0
+        self.eof = False
+
+        # a length or a distance is base + the extra bits after its code
+        if fmt == 'defl':
+            self.length_base = [0]*31
+            self.length_extra = list(range(2, 33))
+            self.dist_base = [0]*32
+            self.dist_extra = list(range(0, 32))
+        else:
+            self.length_base = LENGTH_BASE
+            self.length_extra = LENGTH_EXTRA
+            self.dist_base = DIST_BASE
+            self.dist_extra = DIST_EXTRA
+
+    def decompress(self, chunk: bytearray) -> bytearray:
+        """ Decompresses a chunk of data. Returns the data that could be
+            decompressed, incomplete codes are kept for the later calls.
+        """
+        self.in_bits.feed(chunk)
+        out = self.window
+        start = len(out)
+        try:
+            if not self.header_read:
+                self.read_atomic(
+                    lambda: read_container_header(self.in_bits, self.fmt,
+                                                  self.zdict))
+                self.header_read = True
+            while not self.blocks_done:
+                if self.block is None:
+                    self.read_block_header()
+                self.read_block(out)
+        except EndOfData:
+            pass
+
+        if self.stats is not None:
+            self.stats.input_bytes += len(chunk)
+            self.stats.output_bytes += len(out) - start
+
+        self.checksum = update_checksum(self.fmt, self.checksum, out[start:])
+        self.size += len(out) - start
+        if self.blocks_done and not self.eof:
+            try:
+                self.read_atomic(lambda: read_container_trailer(
+                    self.in_bits, self.fmt, self.checksum, self.size))
+                self.eof = True
+            except EndOfData:
+                pass
+
+        self.window = out[-WINDOW_SIZE:]
+        return out[start:]
+
+    def read_atomic(self, read):
+        """ Calls read, which reads from the input. If the input ends,
+            the reader is returned to where it was before the call.
+        """
+        in_bits = self.in_bits
+        mark = in_bits.mark()
+        try:
+            read()
+        except EndOfData:
+            in_bits.restore(mark)
+            raise
+
+    def read_block(self, out: bytearray):
+        """ Reads the data of the current block into out
+            and adds it to the statistics.
+        """
+        read = self.read_symbols if self.block[1] is not None \
+            else self.read_stored
+        stats = self.stats
+        if stats is None:
+            read(out)
+            return
+
+        start = self.in_bits.bit_pos()
+        n_out = len(out)
+        match_length_total = stats.match_length_total
+        try:
+            with stats.timer('decode'):
+                read(out)
+        finally:
+            stats.payload_bits += self.in_bits.bit_pos() - start
+            if read == self.read_symbols:
+                stats.literals += len(out) - n_out - \
+                    (stats.match_length_total - match_length_total)
+
+    def read_block_header(self):
+        """ Reads the header and the code tables of the next block
+        """
+        start = self.in_bits.bit_pos()
+        with timer(self.stats, 'header'):
+            self.read_atomic(self.read_tables)
+        if self.stats is not None:
+            self.stats.blocks += 1
+            self.stats.header_bits += self.in_bits.bit_pos() - start
+
+    def read_tables(self):
+        """ Reads the header of the next block
+        """
+        if self.fmt == 'defl':
+            (final, block_type) = parse_header(self.in_bits)
+            if block_type == BLOCK_STORED:
+                length = self.in_bits.read_bytes(4)
+                if len(length) < 4:
+                    e = 'Unexpected end of data'
+                    raise EndOfData(e)
+                self.block = (final, None, int.from_bytes(length, 'little'))
+                return
+            sym_table = read_code_table(self.in_bits, 288)
+            dist_table = read_code_table(self.in_bits, 32)
+            self.block = (final, sym_table, dist_table)
+        else:
+            self.block = rfc1951.read_block_header(self.in_bits)
+
+    def end_block(self, final: bool):
+        """ Moves on to the next block
+        """
+        if self.fmt == 'defl':
+            self.in_bits.align()
+        self.block = None
+        self.blocks_done = final
+
+    def read_stored(self, out: bytearray):
+        """ Copies the data of the current stored block into out
+        """
+        (final, _, n_left) = self.block
+        data = self.in_bits.read_bytes(n_left)
+        out += data
+        n_left -= len(data)
+        self.block = (final, None, n_left)
+        if n_left > 0:
+            e = 'Unexpected end of data'
+            raise EndOfData(e)
+        self.end_block(final)
+
+    def read_symbols(self, out: bytearray):
+        """ Decodes the symbols of the current block into out
+            until the end of the block.
+        """
+        in_bits = self.in_bits
+        (final, sym_table, dist_table) = self.block
+        length_base = self.length_base
+        length_extra = self.length_extra
+        dist_base = self.dist_base
+        dist_extra = self.dist_extra
+        stats = self.stats
+        while True:
+            mark = in_bits.mark()
+            try:
+                code = read_code(in_bits, sym_table)
+                if code < 256:
+                    out.append(code)
+                    continue
+                if code == 256:
+                    break
+                i = code - 257
+                if i >= len(length_base):
+                    e = f'Invalid length code {code}'
+                    raise Exception(e)
+                length = length_base[i] + in_bits.read(length_extra[i])
+                d = read_code(in_bits, dist_table)
+                if d >= len(dist_base):
+                    e = f'Invalid distance code {d}'
+                    raise Exception(e)
+                dist = dist_base[d] + in_bits.read(dist_extra[d])
+            except EndOfData:
+                in_bits.restore(mark)
+                raise
+
+            if dist == 0 or dist > len(out):
+                e = f'Invalid distance {dist}'
+                raise Exception(e)
+            append_match(out, length, dist)
+            if stats is not None:
+                stats.count_match(length, dist)
 
+        self.end_block(final)
+
+
+def defl_decode(in_arr: bytearray, fmt: str = 'defl',
+                stats: Stats = None, zdict: bytes = None) -> bytearray:
+    """ Decodes data that was compressed using Deflate-algorithm
+        in one of FORMATS. If stats is given,
+        the statistics of the decompression are collected into it.
+        zdict is the preset dictionary the data was compressed with.
+    """
+    decompressor = Decompressor(fmt, stats, zdict)
+    out = decompressor.decompress(in_arr)
+    if not decompressor.eof:
+        e = 'Unexpected end of data'
+        raise Exception(e)
+    return out
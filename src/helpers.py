@@ -1,5 +1,4 @@
 from math import floor, log
-from collections import deque
 
 
 def bits_to_str(lst: list[int]) -> str:
@@ -59,26 +58,164 @@ def int_to_bit_str(b: int) -> str:
     return bits_to_str(int_to_bits(b))
 
 
-def clear_buf(out: bytearray(), out_buf: deque[int], until_len: int = 7):
-    """ Removes extra bits from out_buf until
-        size of the buffer is until_len
+class BitWriter:
+    """ Packs bits into a preallocated bytearray.
+        The bits are kept in an integer accumulator and the values are
+        written least significant bit first, ie. the first written bit
+        is the lowest bit of the first byte.
     """
-    while len(out_buf) > until_len:
-        bitlist = []
-        for i in range(0, min(len(out_buf), 8)):
-            bitlist.append(out_buf.popleft())
-        out.append(bits_to_int(bitlist))
-
-
-def append_vals(buf: deque, lst: list):
-    """ Takes values from a list and appends then into a deque
+    def __init__(self, size_hint: int = 0):
+        self.out = bytearray(max(size_hint, 64))
+        self.pos = 0
+        self.acc = 0
+        self.n_bits = 0
+
+    def reserve(self, n_bytes: int):
+        """ Makes sure that there is room for n_bytes more bytes
+        """
+        if self.pos + n_bytes > len(self.out):
+            self.out += bytearray(max(len(self.out), n_bytes))
+
+    def flush_bytes(self):
+        """ Moves all the complete bytes from the accumulator to out
+        """
+        n_bytes = self.n_bits >> 3
+        self.reserve(n_bytes)
+        n_bits = n_bytes << 3
+        out_bytes = (self.acc & ((1 << n_bits) - 1)).to_bytes(n_bytes, 'little')
+        self.out[self.pos:self.pos+n_bytes] = out_bytes
+        self.pos += n_bytes
+        self.acc >>= n_bits
+        self.n_bits -= n_bits
+
+    def write(self, value: int, n_bits: int):
+        """ Writes the n_bits lowest bits of value
+        """
+        self.acc |= value << self.n_bits
+        self.n_bits += n_bits
+        if self.n_bits >= 64:
+            self.flush_bytes()
+
+    def align(self):
+        """ Pads the written bits with zeros to the next byte boundary
+        """
+        self.n_bits += -self.n_bits % 8
+        self.flush_bytes()
+
+    def write_bytes(self, data: bytearray):
+        """ Aligns the output to a byte boundary and writes data as is
+        """
+        self.align()
+        self.reserve(len(data))
+        self.out[self.pos:self.pos+len(data)] = data
+        self.pos += len(data)
+
+    def bit_pos(self) -> int:
+        """ Returns the number of bits in the buffer
+        """
+        return self.pos*8 + self.n_bits
+
+    def take(self) -> bytearray:
+        """ Returns and removes the complete bytes written so far.
+            The bits of an incomplete last byte are kept.
+        """
+        self.flush_bytes()
+        out = self.out[:self.pos]
+        self.pos = 0
+        return out
+
+    def getvalue(self) -> bytearray:
+        """ Returns the written data, padding the last byte with zeros
+        """
+        self.align()
+        return self.out[:self.pos]
+
+
+class EndOfData(Exception):
+    """ Raised when the input ends before the data that is being read
     """
-    for x in lst:
-        buf.append(x)
 
 
-def read_to_buf(in_vals: deque[int], in_buf: deque[str], min_len: int):
-    """ Reads input values until in_buf has at least min_len bits of data
+class BitReader:
+    """ Reads bits from a bytearray, least significant bit first,
+        ie. the same way BitWriter writes them.
+        The bits are read into an integer accumulator several bytes at a time.
     """
-    while len(in_buf) < min_len:
-        append_vals(in_buf, int_to_bit_str(in_vals.popleft()))
+    def __init__(self, data: bytearray):
+        self.data = data
+        self.pos = 0
+        self.acc = 0
+        self.n_bits = 0
+
+    def refill(self):
+        """ Reads the next bytes of data to the accumulator
+        """
+        chunk = self.data[self.pos:self.pos+8]
+        self.acc |= int.from_bytes(chunk, 'little') << self.n_bits
+        self.pos += len(chunk)
+        self.n_bits += len(chunk) * 8
+
+    def peek(self, n_bits: int) -> int:
+        """ Returns the next n_bits bits without consuming them.
+            Missing bits after the end of the data are zeros.
+        """
+        while self.n_bits < n_bits and self.pos < len(self.data):
+            self.refill()
+        return self.acc & ((1 << n_bits) - 1)
+
+    def consume(self, n_bits: int):
+        """ Drops n_bits bits that have been peeked
+        """
+        if n_bits > self.n_bits:
+            e = 'Unexpected end of data'
+            raise EndOfData(e)
+        self.acc >>= n_bits
+        self.n_bits -= n_bits
+
+    def read(self, n_bits: int) -> int:
+        """ Reads an integer of n_bits bits
+        """
+        value = self.peek(n_bits)
+        self.consume(n_bits)
+        return value
+
+    def align(self):
+        """ Skips the bits until the next byte boundary
+        """
+        self.consume(self.n_bits % 8)
+
+    def bit_pos(self) -> int:
+        """ Returns the number of bits read from the data
+        """
+        return self.pos*8 - self.n_bits
+
+    def read_bytes(self, n: int) -> bytearray:
+        """ Reads at most n bytes at a byte boundary.
+            Returns fewer bytes if the data ends.
+        """
+        out = bytearray()
+        while self.n_bits >= 8 and len(out) < n:
+            out.append(self.read(8))
+        n_left = min(n - len(out), len(self.data) - self.pos)
+        out += self.data[self.pos:self.pos+n_left]
+        self.pos += n_left
+        return out
+
+    def feed(self, data: bytearray):
+        """ Appends more data to be read and
+            drops the data that has already been read to the accumulator.
+        """
+        del self.data[:self.pos]
+        self.pos = 0
+        self.data += data
+
+    def mark(self) -> (int, int, int):
+        """ Returns the current state of the reader for restore
+        """
+        return (self.pos, self.acc, self.n_bits)
+
+    def restore(self, mark: (int, int, int)):
+        """ Returns the reader to the state given by mark
+            so that the same bits can be read again.
+        """
+        (self.pos, self.acc, self.n_bits) = mark
@@ -1,88 +1,103 @@
-from heapq import heappush, heappop, heapify
-from collections import deque
-from helpers import (
-    append_vals, bits_to_str, clear_buf, int_to_bits, read_to_buf
-)
-
-
-class HuffTree:
-    def __init__(self, value: int, count: int):
-        self.value = value
-        self.count = count
-        self.left = None
-        self.right = None
-
-    def merge(self, other):
-        first = HuffTree(self.value, self.count)
-        first.left = self.left
-        first.right = self.right
-        self.value = None
-        self.count = first.count + other.count
-        self.left = first
-        self.right = other
-
-    def __str__(self):
-        if self.value is not None:
-            return f"{self.count} {self.value}"
-        else:
-            return str(self.count) + ": ( " + \
-                    self.left.__str__() + ", " + self.right.__str__() + \
-                    " )"
-
-    # for printing with heapq
-    def __repr__(self):
-        return self.__str__()
+from collections import OrderedDict
+from heapq import heappop, heappush, merge
+from helpers import BitReader, BitWriter, bits_to_int, int_to_bits
+import npbackend
 
-    # for this to work with heapq
-    def __lt__(self, other):
-        return self.count < other.count
+MAX_CODE_LEN = 15
+ROOT_BITS = 9
 
 
-def counts(in_arr: list[int], n_values: int) -> list:
-    """ Takes input array and transforms all the values
-        into a dict with different values as keys and
-        counts as values. Also transforms the value-count
-        pairs into HuffTree nodes.
+def counts(in_arr: list[int], n_values: int) -> list[int]:
+    """ Counts how many times each value between 0 and n_values-1
+        appears in the input array. Large byte arrays are counted
+        with NumPy if it is installed.
     """
+    if isinstance(in_arr, (bytes, bytearray, memoryview)) and \
+            npbackend.enabled(len(in_arr)):
+        return npbackend.byte_counts(in_arr, n_values)
     d = [0]*(n_values)
     for b in in_arr:
         d[b] += 1
-
-    hufftree_list = []
-    for b in range(0, n_values):
-        # only add nonzero entries
-        if d[b] > 0:
-            hufftree_list.append(HuffTree(b, d[b]))
-
-    return hufftree_list
+    return d
 
 
-def counts_to_hufftree(count_list: list[HuffTree]) -> HuffTree:
-    """ Constructs a Huffman Tree from a list of HuffTree nodes.
+def huffman_code_lens(leaves: list[(int, int)]) -> list[int]:
+    """ Returns the code lengths of a plain Huffman code for the sorted
+        (weight, symbol) leaves, in the order of the leaves.
     """
-    heapify(count_list)
-    while len(count_list) > 1:
-        node1 = heappop(count_list)
-        node2 = heappop(count_list)
-        node1.merge(node2)
-        heappush(count_list, node1)
-
-    return heappop(count_list)
+    n = len(leaves)
+    # the leaves are nodes 0..n-1, the parents get the next ids
+    heap = [(leaves[i][0], i) for i in range(0, n)]
+    parents = [0]*(2*n - 1)
+    node = n
+    while len(heap) > 1:
+        (weight1, first) = heappop(heap)
+        (weight2, second) = heappop(heap)
+        parents[first] = parents[second] = node
+        heappush(heap, (weight1 + weight2, node))
+        node += 1
+    # the parents have larger ids than their children, the root is the last
+    depths = [0]*(2*n - 1)
+    for node in range(2*n - 3, -1, -1):
+        depths[node] = depths[parents[node]] + 1
+    return depths[:n]
+
+
+def package(items: list[(int, int)]) -> list[(int, int)]:
+    """ Combines consecutive pairs of (weight, symbol) items into
+        packages, which have None as the symbol. The last item is
+        dropped if it has no pair.
+    """
+    return [(items[i][0] + items[i+1][0], None)
+            for i in range(0, len(items) - 1, 2)]
 
 
-def hufftree_to_code_lens(code_lens: list, ht: HuffTree,
-                          current_len: int) -> list:
-    """ Takes a huffman tree and transforms it
-        into a list with code lengths corresponding to the length
-        of the huffman encoding of the given symbol.
+def limited_code_lens(count_list: list[int],
+                      max_len: int = MAX_CODE_LEN) -> list[int]:
+    """ Calculates optimal code lengths which are at most max_len bits
+        from the symbol counts. The plain Huffman code is used when it is
+        short enough, which is the usual case, and the package-merge
+        algorithm otherwise. Symbols with zero count get code length 0.
     """
-    if ht.value is not None:
-        # this does not work correctly when there
-        # is a simple node, the max fixes that
-        code_lens[ht.value] = max(current_len, 1)
-    else:
-        hufftree_to_code_lens(code_lens, ht.left, current_len+1)
-        hufftree_to_code_lens(code_lens, ht.right, current_len+1)
+    code_lens = [0]*len(count_list)
+    leaves = sorted((count_list[sym], sym)
+                    for sym in range(0, len(count_list)) if count_list[sym] > 0)
+    if len(leaves) == 0:
+        return code_lens
+    if len(leaves) == 1:
+        # a single symbol still needs a code of one bit
+        code_lens[leaves[0][1]] = 1
+        return code_lens
+    if len(leaves) > 2**max_len:
+        e = f'{len(leaves)} symbols do not fit into {max_len}-bit codes'
+        raise Exception(e)
+
+    lens = huffman_code_lens(leaves)
+    if max(lens) <= max_len:
+        for ((_, sym), length) in zip(leaves, lens):
+            code_lens[sym] = length
+        return code_lens
+
+    # each round merges the packages of the previous round with the leaves,
+    # both are sorted by weight and the leaves come first on equal weights
+    rounds = [leaves]
+    for i in range(1, max_len):
+        rounds.append(list(merge(leaves, package(rounds[-1]),
+                                 key=lambda item: item[0])))
+    # the first 2n-2 items of the last round are selected, and the selected
+    # packages are made of the first items of the previous round, so
+    # a symbol's code length is the number of selected leaves of it
+    selected = 2*len(leaves) - 2
+    for items in reversed(rounds):
+        packages = 0
+        for (weight, sym) in items[:selected]:
+            if sym is None:
+                packages += 1
+            else:
+                code_lens[sym] += 1
+        selected = 2*packages
+
+    return code_lens
 
 
 def canonical_huffcode(bit_lens: list[int]) -> list[list[int]]:
@@ -115,14 +130,12 @@ def canonical_huffcode(bit_lens: list[int]) -> list[list[int]]:
     return [output[i] for i in bit_lens_inv_ord]
 
 
-def get_codes(vals: list[int], n_vals: int) -> (list[int], list[list[int]]):
+def get_codes(vals: list[int], n_vals: int,
+              max_len: int = MAX_CODE_LEN) -> (list[int], list[list[int]]):
     """ Gets list of values and returns their code lengths
-        and the respective codes.
+        and the respective codes. The codes are at most max_len bits long.
     """
-    counts_dict = counts(vals, n_vals)
-    hufftree = counts_to_hufftree(counts_dict)
-    code_lens = [0]*n_vals
-    hufftree_to_code_lens(code_lens, hufftree, 0)
+    code_lens = limited_code_lens(counts(vals, n_vals), max_len)
     return (code_lens, canonical_huffcode(code_lens))
 
 
@@ -155,77 +168,190 @@ def rle(bit_lengths: list[int]) -> bytearray:
     return output
 
 
+def code_values(codes: list[list[int]]) -> list[int]:
+    """ Transforms lists of code bits into integers which can be
+        written with BitWriter, so that the first bit is written first.
+    """
+    return [bits_to_int(code) for code in codes]
+
+
 def huff_encode(in_arr: bytearray) -> bytearray:
     """ Encodes the input array using Canonical Huffman Encoding.
+        With NumPy, the codes of large inputs are packed as arrays.
     """
-    in_vals = deque(in_arr)
-    in_vals.append(256)
-    (code_lens, codes) = get_codes(list(in_vals), 257)
+    count_list = counts(in_arr, 257)
+    # the end of data
+    count_list[256] += 1
+    code_lens = limited_code_lens(count_list)
 
-    out = bytearray()
+    out = BitWriter(len(in_arr))
 
     # add rle bitlengths
-    out += rle(code_lens)
+    out.write_bytes(rle(code_lens))
 
     # add input data
-    out_buf = deque([])
-    while len(in_vals) > 0:
-        val = in_vals.popleft()
-        append_vals(out_buf, codes[val])
-        clear_buf(out, out_buf, 7)
+    if npbackend.enabled(len(in_arr)):
+        values = npbackend.canonical_code_values(code_lens)
+        (packed, rest, n_rest) = npbackend.pack_codes(
+            npbackend.np.frombuffer(in_arr, dtype=npbackend.np.uint8),
+            values, code_lens)
+        out.write_bytes(packed)
+        out.write(rest, n_rest)
+    else:
+        values = code_values(canonical_huffcode(code_lens))
+        for val in in_arr:
+            out.write(values[val], code_lens[val])
+    out.write(values[256], code_lens[256])
 
-    # add rest of the buffer
-    clear_buf(out, out_buf, 0)
+    return out.getvalue()
 
-    return out
 
+def read_rle(in_bits: BitReader, n_vals: int) -> bytes:
+    """ Reads the RLE encoded code lengths of n_vals values
+        and returns them as they are in the input.
+    """
+    header = bytearray()
+    n = 0
+    while n < n_vals:
+        count = in_bits.read(8)
+        val = in_bits.read(8)
+        header += bytes([count, val])
+        n += count
+    return bytes(header)
+
+
+def rle_decode(header: bytes) -> list[int]:
+    """ Expands RLE encoded (count, value) pairs
+    """
+    bit_lengths = []
+    for i in range(0, len(header), 2):
+        bit_lengths += [header[i+1]]*header[i]
+    return bit_lengths
+
+
+def read_code_lens(in_bits: BitReader, n_vals: int) -> list[int]:
+    """ Reads n_vals code lengths from the input,
+        assuming they are encoded using RLE.
+    """
+    return rle_decode(read_rle(in_bits, n_vals))
+
+
+def build_table(codes: list[(int, int, int)], bits: int) -> (int, list):
+    """ Builds a lookup table of 2**bits entries from
+        (code value, code length, symbol) triples, where the code values are
+        in the order they are read. Each entry is either
+        (symbol, code length) or (None, table) for codes longer than bits,
+        in which case the rest of the code is looked up from the next table.
+    """
+    entries = [None]*(1 << bits)
+    long_codes = {}
+    for (value, length, sym) in codes:
+        if length <= bits:
+            # every entry starting with the code decodes to the symbol
+            for i in range(value, 1 << bits, 1 << length):
+                entries[i] = (sym, length)
+        else:
+            prefix = value & ((1 << bits) - 1)
+            if prefix not in long_codes:
+                long_codes[prefix] = []
+            long_codes[prefix].append((value >> bits, length - bits, sym))
+
+    for (prefix, sub_codes) in long_codes.items():
+        sub_bits = min(max(length for (_, length, _) in sub_codes), ROOT_BITS)
+        entries[prefix] = (None, build_table(sub_codes, sub_bits))
 
-def read_code_dict(in_vals: deque[int], n_vals: int) -> dict[str, int]:
-    """ Reads code dict from input values, assuming its encoded using
+    return (bits, entries)
+
+
+def decode_table(code_lens: list[int]) -> (int, list):
+    """ Builds a multi-level lookup table for decoding
+        the canonical Huffman code with the given code lengths.
+    """
+    values = code_values(canonical_huffcode(code_lens))
+    codes = [(values[sym], code_lens[sym], sym)
+             for sym in range(0, len(code_lens)) if code_lens[sym] > 0]
+    bits = min(max(code_lens), ROOT_BITS)
+    return build_table(codes, bits)
+
+
+class TableCache:
+    """ Keeps the most recently used decoding tables, so that the table
+        is not built again when the same code lengths are read again.
+        The keys identify the code lengths, eg. the raw bytes of
+        the header they were read from. At most max_size tables are kept.
+    """
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: object, read_lens) -> (int, list):
+        """ Returns the table for the key. If it is not in the cache,
+            it is built from the code lengths returned by read_lens().
+        """
+        table = self.tables.get(key)
+        if table is not None:
+            self.tables.move_to_end(key)
+            self.hits += 1
+            return table
+
+        self.misses += 1
+        table = decode_table(read_lens())
+        if self.max_size > 0:
+            self.tables[key] = table
+            if len(self.tables) > self.max_size:
+                self.tables.popitem(last=False)
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# the tables are shared by all the decoders
+TABLE_CACHE = TableCache()
+
+
+def read_code_table(in_bits: BitReader, n_vals: int) -> (int, list):
+    """ Reads code lengths from the input, assuming they are encoded using
         Canonical Huffman Coding and RLE for the code lengths.
-        Returns the dict.
+        Returns the lookup table for decoding the codes.
     """
-    bit_lengths = []
-    while len(bit_lengths) < n_vals:
-        count = in_vals.popleft()
-        val = in_vals.popleft()
-        for j in range(0, count):
-            bit_lengths.append(val)
-    keys = canonical_huffcode(bit_lengths)
-    codes = {}
-    for j in range(0, n_vals):
-        if len(keys[j]) > 0:
-            codes[bits_to_str(keys[j])] = j
-
-    return codes
-
-
-def read_code(in_vals: deque[int], in_buf: deque[str],
-              codes: dict[str, int]) -> int:
-    """ Reads characters from the input value until it finds
-        a code thats included in the codes dictionary.
+    header = read_rle(in_bits, n_vals)
+    return TABLE_CACHE.get(('rle', header), lambda: rle_decode(header))
+
+
+def read_code(in_bits: BitReader, table: (int, list)) -> int:
+    """ Reads a code from the input using the lookup table.
         Returns the value of the code.
     """
+    (bits, entries) = table
+    entry = entries[in_bits.peek(bits)]
+    while entry is not None and entry[0] is None:
+        in_bits.consume(bits)
+        (bits, entries) = entry[1]
+        entry = entries[in_bits.peek(bits)]
 
-    key = ""
-    while key not in codes:
-        read_to_buf(in_vals, in_buf, 1)
-        key += in_buf.popleft()
-    return codes[key]
+    if entry is None:
+        e = 'Invalid Huffman code'
+        raise Exception(e)
+    in_bits.consume(entry[1])
+    return entry[0]
 
 
 def huff_decode(in_arr: bytearray) -> bytearray:
     """ Decodes the input array assuming it was encoded with
         Canonical Huffman Encoding
     """
-    in_vals = deque(in_arr)
-    codes = read_code_dict(in_vals, 257)
+    in_bits = BitReader(in_arr)
+    table = read_code_table(in_bits, 257)
 
     out = bytearray()
-    in_buf = deque([])
-    code = read_code(in_vals, in_buf, codes)
+    code = read_code(in_bits, table)
     while code != 256:
-        out += code.to_bytes(1, 'big')
-        code = read_code(in_vals, in_buf, codes)
+        out.append(code)
+        code = read_code(in_bits, table)
 
-    return out
\ No newline at end of file
+    return out
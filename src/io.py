@@ -1,55 +1,306 @@
-from deflate import defl_encode, defl_decode
+from archive import create_archive, extract_archive, find_files, run_jobs
+from blockindex import has_index
+from deflate import Compressor, Decompressor, ParallelCompressor, FORMATS
+from lzss import DEFAULT_LEVEL
+from parallel import ParallelDecompressor
+from seekable import SYNC_INTERVAL, SeekableCompressor, SeekableReader
+from stats import Stats
+from strategy import STRATEGIES
+from contextlib import nullcontext
+import argparse
+import os
 import sys
 
+CHUNK_SIZE = 2**20
 
-def deflate_file(input_filename: str):
-    output_filename = input_filename + '.defl'
-    input_data = bytearray()
-    with open(input_filename, 'rb') as f:
-        byte = f.read(1)
-        while byte:
-            input_data.append(int.from_bytes(byte, 'big'))
-            byte = f.read(1)
-    deflated_data = defl_encode(input_data)
-    out_file = open(output_filename, 'wb')
-    out_file.write(deflated_data)
-    out_file.close()
-
-
-def inflate_file(output_filename: str):
-    input_filename = output_filename + '.defl'
-    deflated_data = bytearray()
-    of2 = output_filename + '.infl'
-    with open(input_filename, 'rb') as f:
-        byte = f.read(1)
-        while byte:
-            deflated_data.append(int.from_bytes(byte, 'big'))
-            byte = f.read(1)
-
-    inflated_data = defl_decode(deflated_data)
-    out_file = open(of2, 'wb')
-    out_file.write(inflated_data)
-    out_file.close()
-
-
-def print_usage(progname: str):
-    print('usage:')
-    print(f' python3 {progname} op filename')
-    print('')
-    print('arguments:')
-    print(' op:       either "inflate" or "deflate"')
-    print(' filename: the name of the file')
+# the file extension of the compressed files of each format
+EXTENSIONS = {'defl': '.defl', 'raw': '.deflate', 'zlib': '.zz',
+              'gzip': '.gz'}
+
+
+def open_input(filename: str):
+    """ Opens the file for reading, '-' means standard input.
+    """
+    if filename == '-':
+        return nullcontext(sys.stdin.buffer)
+    return open(filename, 'rb')
+
+
+def open_output(filename: str):
+    """ Opens the file for writing, '-' means standard output.
+    """
+    if filename == '-':
+        return nullcontext(sys.stdout.buffer)
+    return open(filename, 'wb')
+
+
+def read_chunks(f):
+    """ Reads the file in chunks of CHUNK_SIZE bytes into the same buffer.
+        The chunks are memoryviews of the buffer, so a chunk
+        is valid only until the next one is read.
+    """
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    n = f.readinto(buf)
+    while n:
+        yield view[:n]
+        n = f.readinto(buf)
+
+
+def deflate_file(input_filename: str, output_filename: str = None,
+                 level: int = DEFAULT_LEVEL, jobs: int = 1,
+                 fmt: str = 'defl', stats: Stats = None,
+                 zdict: bytes = None, strategy: str = 'auto',
+                 sync_interval: int = None):
+    if output_filename is None:
+        output_filename = '-' if input_filename == '-' \
+            else input_filename + EXTENSIONS[fmt]
+    if sync_interval is not None:
+        if fmt != 'defl' or jobs > 1:
+            e = 'Seekable files are supported only for defl with one job'
+            raise Exception(e)
+        compressor = SeekableCompressor(level, sync_interval=sync_interval,
+                                        stats=stats, zdict=zdict,
+                                        strategy=strategy)
+    elif jobs > 1:
+        if fmt != 'defl':
+            e = f'Parallel compression is not supported for {fmt}'
+            raise Exception(e)
+        compressor = ParallelCompressor(level, jobs=jobs, stats=stats,
+                                        zdict=zdict, strategy=strategy,
+                                        index=True)
+    else:
+        compressor = Compressor(level, fmt=fmt, stats=stats, zdict=zdict,
+                                strategy=strategy)
+    with open_input(input_filename) as f, \
+            open_output(output_filename) as out_file:
+        for chunk in read_chunks(f):
+            out_file.write(compressor.compress(chunk))
+        out_file.write(compressor.flush())
+
+
+def inflate_file(filename: str, output_filename: str = None,
+                 fmt: str = 'defl', stats: Stats = None,
+                 zdict: bytes = None, jobs: int = 1):
+    input_filename = '-' if filename == '-' else filename + EXTENSIONS[fmt]
+    if output_filename is None:
+        output_filename = '-' if filename == '-' else filename + '.infl'
+    if jobs > 1 and fmt != 'defl':
+        e = f'Parallel decompression is not supported for {fmt}'
+        raise Exception(e)
+    # only files with an index can be decompressed in parallel
+    if jobs > 1 and input_filename != '-':
+        with open(input_filename, 'rb') as f:
+            if has_index(f):
+                with open_output(output_filename) as out_file:
+                    decompressor = ParallelDecompressor(f, jobs, stats, zdict)
+                    for part in decompressor.decompress():
+                        out_file.write(part)
+                return
+
+    decompressor = Decompressor(fmt, stats, zdict)
+    with open_input(input_filename) as f, \
+            open_output(output_filename) as out_file:
+        for chunk in read_chunks(f):
+            out_file.write(decompressor.decompress(chunk))
+    if not decompressor.eof:
+        e = f'Unexpected end of data in {input_filename}'
+        raise Exception(e)
+
+
+def deflate_files(paths: list[str], level: int = DEFAULT_LEVEL,
+                  jobs: int = 1, fmt: str = 'defl', zdict: bytes = None,
+                  strategy: str = 'auto') -> int:
+    """ Compresses the files and the directory trees of paths, every
+        file into its own file, with jobs worker processes. Like gzip -r,
+        the compressed and decompressed files found in the directory trees
+        are skipped. Returns the number of files.
+    """
+    skip = tuple(EXTENSIONS.values()) + ('.infl',)
+    files = find_files(paths, skip=skip)
+    args = [(path, None, level, 1, fmt, None, zdict, strategy)
+            for path in files]
+    for _ in run_jobs(deflate_file, args, jobs):
+        pass
+    return len(files)
+
+
+def inflate_files(paths: list[str], jobs: int = 1, fmt: str = 'defl',
+                  zdict: bytes = None) -> int:
+    """ Decompresses the files of paths, given without the file extension,
+        and the compressed files in the directory trees of paths,
+        with jobs worker processes. Returns the number of files.
+    """
+    extension = EXTENSIONS[fmt]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [name[:-len(extension)]
+                      for name in find_files([path], extension)]
+        else:
+            files.append(path)
+    args = [(path, None, fmt, None, zdict) for path in files]
+    for _ in run_jobs(inflate_file, args, jobs):
+        pass
+    return len(files)
+
+
+def read_file_range(filename: str, offset: int, length: int = None,
+                    output_filename: str = None, stats: Stats = None,
+                    zdict: bytes = None):
+    """ Decompresses a range of a seekable file to the output,
+        standard output by default.
+    """
+    if filename == '-':
+        e = 'read needs a seekable file, not standard input'
+        raise Exception(e)
+    input_filename = filename + EXTENSIONS['defl']
+    if output_filename is None:
+        output_filename = '-'
+    with open(input_filename, 'rb') as f, \
+            open_output(output_filename) as out_file:
+        reader = SeekableReader(f, stats, zdict)
+        if length is None:
+            length = max(reader.size() - offset, 0)
+        for part in reader.read_parts(offset, length):
+            out_file.write(part)
+
+
+def parse_args(l: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog=f'python3 {l[0]}')
+    parser.add_argument('op', choices=['inflate', 'deflate', 'read'],
+                        help='"inflate", "deflate" or "read" for reading '
+                        'a range of a seekable file')
+    parser.add_argument('filenames', nargs='*', metavar='filename',
+                        help='the name of the file, "-" for standard input. '
+                        'For inflate the name should not include '
+                        'the file extension (.defl, .deflate, .zz or .gz). '
+                        'With several files or directories, every file is '
+                        'compressed or decompressed into its own file')
+    parser.add_argument('-o', dest='output',
+                        help='the name of the output file, '
+                        '"-" for standard output (default: filename.defl '
+                        'or filename.infl, standard output for "-" '
+                        'and for read)')
+    for level in range(1, 10):
+        parser.add_argument(f'-{level}', dest='level', action='store_const',
+                            const=level, help='compression level from -1 '
+                            '(fastest) to -9 (compresses the most), '
+                            f'default: -{DEFAULT_LEVEL}'
+                            if level == 1 else argparse.SUPPRESS)
+    parser.set_defaults(level=DEFAULT_LEVEL)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes compressing or '
+                        'decompressing blocks in parallel, or whole files '
+                        'with several files, directories or an archive. '
+                        'Files compressed with --jobs or --seekable can be '
+                        'decompressed in parallel (default: 1)')
+    parser.add_argument('-a', '--archive',
+                        help='for deflate, pack the files into this archive, '
+                        'for inflate, extract this archive into '
+                        'the directory given with -o (default: .)')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='defl',
+                        help='"defl" for the format of this project, "raw" '
+                        'for RFC 1951 Deflate, "zlib" or "gzip" for Deflate '
+                        'in a zlib or gzip container (default: defl)')
+    parser.add_argument('--dict', dest='zdict',
+                        help='a file used as a preset dictionary, '
+                        'the same file has to be given for inflate')
+    parser.add_argument('-s', '--strategy', choices=STRATEGIES,
+                        default='auto',
+                        help='"lzss" searches for matches, "huffman" codes '
+                        'only literals, "rle" only runs of a byte and '
+                        '"stored" copies the data, "auto" chooses one of '
+                        'them for every block (default: auto)')
+    parser.add_argument('--seekable', action='store_true',
+                        help='reset the history at sync points and write '
+                        'an index, so that ranges can be read quickly '
+                        'with read (only for defl)')
+    parser.add_argument('--sync-interval', type=int,
+                        help='bytes of input between the sync points of '
+                        f'a seekable file (default: {SYNC_INTERVAL})')
+    parser.add_argument('--offset', type=int, default=0,
+                        help='the first byte to read (default: 0)')
+    parser.add_argument('--length', type=int,
+                        help='the number of bytes to read '
+                        '(default: to the end)')
+    parser.add_argument('--stats', action='store_true',
+                        help='print the time spent in each stage and '
+                        'other statistics to standard error')
+    return parser.parse_intermixed_args(l[1:])
+
+
+def check_single_file_options(args: argparse.Namespace):
+    """ Rejects the options which only work with a single file.
+        Files of an archive are always in the defl format.
+    """
+    options = [('--stats', args.stats), ('--seekable', args.seekable),
+               ('--sync-interval', args.sync_interval is not None)]
+    if args.archive is not None:
+        options.append(('-f', args.format != 'defl'))
+    for (option, given) in options:
+        if given:
+            e = f'{option} cannot be used with several files or an archive'
+            raise Exception(e)
 
 
 def main(l: list):
-    if len(l) != 3:
-        print_usage(l[0])
-    elif l[1] == 'inflate':
-        inflate_file(l[2])
-    elif l[1] == 'deflate':
-        deflate_file(l[2])
+    args = parse_args(l)
+    stats = Stats() if args.stats else None
+    zdict = None
+    if args.zdict is not None:
+        with open(args.zdict, 'rb') as f:
+            zdict = f.read()
+    filenames = args.filenames
+    if args.archive is not None:
+        check_single_file_options(args)
+        if args.op == 'deflate':
+            create_archive(filenames, args.archive, args.level, args.jobs,
+                           zdict, args.strategy)
+        elif args.op == 'inflate':
+            extract_archive(args.archive, args.output or '.', args.jobs,
+                            zdict)
+        else:
+            e = 'Ranges cannot be read from an archive'
+            raise Exception(e)
+        return
+
+    if len(filenames) == 0:
+        e = 'No files given'
+        raise Exception(e)
+    if len(filenames) > 1 or os.path.isdir(filenames[0]):
+        if args.op == 'read' or args.output is not None:
+            e = f'Only one file can be given for {args.op} or -o'
+            raise Exception(e)
+        check_single_file_options(args)
+        if args.op == 'deflate':
+            deflate_files(filenames, args.level, args.jobs, args.format,
+                          zdict, args.strategy)
+        else:
+            inflate_files(filenames, args.jobs, args.format, zdict)
+    elif args.op == 'inflate':
+        inflate_file(filenames[0], args.output, args.format, stats, zdict,
+                     args.jobs)
+    elif args.op == 'read':
+        read_file_range(filenames[0], args.offset, args.length, args.output,
+                        stats, zdict)
     else:
-        print_usage(l[0])
+        sync_interval = None
+        if args.seekable:
+            sync_interval = SYNC_INTERVAL if args.sync_interval is None \
+                else args.sync_interval
+        elif args.sync_interval is not None:
+            e = '--sync-interval requires --seekable'
+            raise Exception(e)
+        deflate_file(filenames[0], args.output, args.level, args.jobs,
+                     args.format, stats, zdict, args.strategy, sync_interval)
+    if stats is not None:
+        print(stats.report(), file=sys.stderr)
 
 
-main(sys.argv)
+if __name__ == '__main__':
+    try:
+        main(sys.argv)
+    except Exception as e:
+        print(f'{sys.argv[0]}: {e}', file=sys.stderr)
+        sys.exit(1)
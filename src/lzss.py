@@ -1,6 +1,37 @@
+from array import array
 from collections import deque
+from copy import copy
+from math import log2
+import re
 from helpers import int_to_bitlen
 
+MIN_MATCH = 3
+MAX_MATCH = 258
+DEFAULT_LEVEL = 6
+HASH_BITS = 15
+HASH_MASK = 2**HASH_BITS - 1
+# a byte repeated at least MIN_MATCH more times
+RUN = re.compile(rb'(.)\1{%d,}' % MIN_MATCH, re.DOTALL)
+
+# Compression levels similar to zlib. The values are:
+# (strategy, good_length, max_lazy, nice_length, max_chain)
+# good_length: shorten the chain when the previous match is this long
+# max_lazy:    do not look for a better match when the match is this long
+#              (for greedy parsing: longest match that is added to the chain)
+# nice_length: stop searching when the match is this long
+# max_chain:   maximum number of positions compared per search
+LEVELS = {
+    1: ('greedy', 4, 4, 8, 4),
+    2: ('greedy', 4, 5, 16, 8),
+    3: ('greedy', 4, 6, 32, 32),
+    4: ('lazy', 4, 4, 16, 16),
+    5: ('lazy', 8, 16, 32, 32),
+    6: ('lazy', 8, 16, 128, 128),
+    7: ('lazy', 8, 32, 128, 256),
+    8: ('optimal', 32, 128, 128, 256),
+    9: ('optimal', 32, 258, 258, 1024),
+}
+
 
 class LZSSNode:
     def __init__(self, char: int = None,
@@ -48,134 +79,689 @@ class LZSSNode:
         return self.__str__()
 
 
-def append_chars(out: deque[LZSSNode], char_buf: deque[int]):
-    """ Transforms characters in char_buf to LZSS nodes
-        and appends them to out.
+class LZSSTokens:
+    """ Compact list of LZSS tokens stored in two parallel arrays.
+        For a literal character, the length is 0 and the value is
+        the character. For a reference, the value is the distance.
     """
-    while len(char_buf) > 0:
-        out.append(LZSSNode(char=char_buf.popleft()))
+    def __init__(self):
+        self.lengths = array('H')
+        self.values = array('I')
+
+    def add_literal(self, char: int):
+        self.lengths.append(0)
+        self.values.append(char)
+
+    def add_match(self, length: int, dist: int):
+        self.lengths.append(length)
+        self.values.append(dist)
+
+    def add_literals(self, data: bytearray):
+        self.lengths.extend(bytes(len(data)))
+        self.values.extend(data)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def slice(self, start: int, end: int) -> 'LZSSTokens':
+        """ Returns the tokens from start to end as new tokens
+        """
+        out = LZSSTokens()
+        out.lengths = self.lengths[start:end]
+        out.values = self.values[start:end]
+        return out
+
+    # tokens can be viewed as LZSS nodes (debugging)
+    def __getitem__(self, i: int) -> LZSSNode:
+        if self.lengths[i] == 0:
+            return LZSSNode(char=self.values[i])
+        else:
+            return LZSSNode(dist=self.values[i], length=self.lengths[i])
 
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self[i]
 
-def append_ref(out: deque[LZSSNode], length: int, dist: int):
-    """ Takes length and distance of reference
-        and appends it to out.
-    """
-    out.append(LZSSNode(dist=dist, length=length))
+    def __repr__(self):
+        return str(list(self))
 
 
-def append_lzss_node(out: deque[LZSSNode], pos: int,
-                     char_buf: deque[int], in_buf: list[int]):
-    """ Makes sure that only matches with 3 or longer len
-        are appended as reference.
-        Otherwise it is appended as a literal character.
+class HashChain:
+    """ Match finder which keeps the last buffer_size bytes of the input
+        in a fixed-size window and indexes their positions by the hashes
+        of their 3-byte prefixes. Positions sharing a hash are chained
+        from the most recent one to the oldest one.
+        Positions are absolute, ie. counted from the start of the input.
     """
-    if len(char_buf) >= 3:
-        append_ref(out, len(char_buf), len(in_buf)-pos-len(char_buf))
-        char_buf.clear()
-    else:
-        append_chars(out, char_buf)
-
-
-def buffer_find_from(pos: int, char_buf: deque[int], in_buf: list[int]) -> bool:
-    """ Checks if 'char_buf' is in 'in_buf' starting from 'pos'
+    def __init__(self, buffer_size: int, max_chain: int = 128,
+                 good_length: int = MAX_MATCH, nice_length: int = MAX_MATCH):
+        self.buffer_size = buffer_size
+        self.max_chain = max_chain
+        self.good_length = good_length
+        self.nice_length = nice_length
+        # room for the history, a new block of input and the lookahead
+        self.window = bytearray(2*buffer_size + MAX_MATCH)
+        # absolute positions of the start and the end of the window data
+        self.base = 0
+        self.end = 0
+        self.head = [-1]*(HASH_MASK+1)
+        # prev[pos % buffer_size] is the previous position with same hash
+        self.prev = [-1]*buffer_size
+        # the number of chain positions compared so far
+        self.probes = 0
+
+    def copy(self) -> 'HashChain':
+        """ Returns a copy of the match finder which can be fed
+            independently of this one.
+        """
+        other = copy(self)
+        other.window = bytearray(self.window)
+        other.head = self.head[:]
+        other.prev = self.prev[:]
+        return other
+
+    def checkpoint(self, start: int, n: int) -> tuple:
+        """ Returns the state needed by rollback to undo the insertions
+            from 'start' on and the feeding of n more bytes, or None if
+            the window would slide or the chains could not be restored.
+            The cost depends only on the number of the positions.
+        """
+        end = self.end + n
+        if end - self.base > len(self.window) or \
+                end - start > self.buffer_size:
+            return None
+        slots = [i % self.buffer_size for i in range(start, end)]
+        return (start, self.end, [self.prev[i] for i in slots])
+
+    def rollback(self, state: tuple):
+        """ Returns the finder to the state of checkpoint. The positions
+            are removed from the hash chains from the newest to the oldest,
+            so every chain gets back the head it had before the position.
+        """
+        (start, end, prev) = state
+        head = self.head
+        for pos in range(self.end - MIN_MATCH, start - 1, -1):
+            key = self.key(pos)
+            if head[key] == pos:
+                head[key] = self.prev[pos % self.buffer_size]
+        for (i, value) in enumerate(prev):
+            self.prev[(start + i) % self.buffer_size] = value
+        self.end = end
+
+    def feed(self, data: bytearray, pos: int):
+        """ Appends at most buffer_size bytes of data to the window.
+            The data before pos-buffer_size is dropped when
+            the window does not have enough room for the new data.
+        """
+        n = len(data)
+        if self.end - self.base + n > len(self.window):
+            keep = max(pos - self.buffer_size, self.base)
+            if self.end - keep + n > len(self.window):
+                e = 'Too much data fed to the window'
+                raise Exception(e)
+            window = self.window
+            window[0:self.end-keep] = window[keep-self.base:self.end-self.base]
+            self.base = keep
+
+        i = self.end - self.base
+        self.window[i:i+n] = data
+        self.end += n
+
+    def byte(self, pos: int) -> int:
+        """ Returns the byte at absolute position 'pos'
+        """
+        return self.window[pos-self.base]
+
+    def key(self, pos: int) -> int:
+        """ Returns the hash of the 3-byte prefix starting at 'pos'
+        """
+        window = self.window
+        i = pos - self.base
+        return ((window[i] << 10) ^ (window[i+1] << 5) ^ window[i+2]) & \
+            HASH_MASK
+
+    def insert(self, pos: int):
+        """ Adds the prefix starting at 'pos' to the hash table
+        """
+        if pos + MIN_MATCH <= self.end:
+            key = self.key(pos)
+            self.prev[pos % self.buffer_size] = self.head[key]
+            self.head[key] = pos
+
+    def find(self, pos: int, max_length: int,
+             prev_length: int = 0) -> (int, int):
+        """ Finds the longest match for the data starting at 'pos'
+            by following at most max_chain links of the hash chain.
+            Only matches longer than prev_length are considered and
+            the chain is shortened if prev_length is already good enough.
+            Returns the length and the distance of the match,
+            length is 0 if there is no match.
+        """
+        chain = self.max_chain
+        if prev_length >= self.good_length:
+            chain >>= 2
+        matches = self.find_all(pos, max_length, prev_length, chain)
+        if len(matches) == 0:
+            return (0, 0)
+        return matches[-1]
+
+    def find_all(self, pos: int, max_length: int, prev_length: int = 0,
+                 chain: int = None) -> list[(int, int)]:
+        """ Follows the hash chain of the data starting at 'pos'
+            and returns every match which is longer than the previous ones
+            as (length, dist) pairs, ordered by increasing length.
+        """
+        max_length = min(max_length, self.end - pos)
+        if max_length < MIN_MATCH or prev_length >= max_length:
+            return []
+
+        window = self.window
+        base = self.base
+        prev = self.prev
+        buffer_size = self.buffer_size
+        # positions which are too far or no longer in the window end the chain
+        limit = max(pos - buffer_size, base - 1)
+        nice_length = min(self.nice_length, max_length)
+        cand = self.head[self.key(pos)]
+        chain = self.max_chain if chain is None else chain
+        max_probes = chain
+        best_len = max(prev_length, MIN_MATCH - 1)
+        i = pos - base
+        matches = []
+        while cand > limit and chain > 0:
+            j = cand - base
+            # the candidate can only be longer if it matches at best_len
+            if window[j+best_len] == window[i+best_len]:
+                length = match_length(window, j, i, max_length)
+                if length > best_len:
+                    best_len = length
+                    matches.append((length, pos - cand))
+                    if length >= nice_length:
+                        break
+            cand = prev[cand % buffer_size]
+            chain -= 1
+
+        self.probes += max_probes - chain
+        return matches
+
+
+def match_length(data: bytearray, cand: int, pos: int, max_length: int) -> int:
+    """ Calculates how many bytes starting from 'cand' and 'pos' are equal,
+        up to max_length.
+    """
+    length = 0
+    while length < max_length and data[cand+length] == data[pos+length]:
+        length += 1
+    return length
+
+
+def greedy_parse(finder: HashChain, out: LZSSTokens, pos: int, end: int,
+                 max_length: int, max_insert: int) -> int:
+    """ Parses the window data from 'pos' to 'end' into out by always
+        using the longest match at the current position.
+        Positions inside matches longer than max_insert are not added
+        to the hash chain, which makes long matches faster to skip.
+        Returns the position where parsing stopped.
     """
-    for i in range(0, len(char_buf)):
-        if char_buf[i] != in_buf[pos+i]:
-            return False
-    return True
+    while pos < end:
+        (length, dist) = finder.find(pos, max_length)
+        finder.insert(pos)
+        if length >= MIN_MATCH:
+            out.add_match(length, dist)
+            if length <= max_insert:
+                for i in range(pos+1, pos+length):
+                    finder.insert(i)
+            pos += length
+        else:
+            out.add_literal(finder.byte(pos))
+            pos += 1
+
+    return pos
 
 
-def buffer_find(char_buf: deque[int], in_buf: list[int],
-                starting_pos: int = -1) -> int:
-    """ Checks if 'char_buf' is included in 'in_buf'
-        Returns 'pos' of matched string if found,
-        otherwise returns -1
+def lazy_parse(finder: HashChain, out: LZSSTokens, pos: int, end: int,
+               max_length: int, max_lazy: int) -> int:
+    """ Like the greedy parsing, but before using a match shorter
+        than max_lazy checks if the next position has a longer match.
+        If it has, the current character is used as a literal instead.
+        Returns the position where parsing stopped.
     """
-    pos = starting_pos if starting_pos >= 0 else len(in_buf) - len(char_buf)
-    while pos >= 0:
-        if buffer_find_from(pos, char_buf, in_buf):
-            return pos
-        pos -= 1
+    match = finder.find(pos, max_length)
+    while pos < end:
+        (length, dist) = match
+        finder.insert(pos)
+        if length < MIN_MATCH:
+            out.add_literal(finder.byte(pos))
+            pos += 1
+            match = finder.find(pos, max_length)
+            continue
+
+        if length < max_lazy:
+            next_match = finder.find(pos+1, max_length, length)
+            if next_match[0] > length:
+                out.add_literal(finder.byte(pos))
+                pos += 1
+                match = next_match
+                continue
+
+        out.add_match(length, dist)
+        for i in range(pos+1, pos+length):
+            finder.insert(i)
+        pos += length
+        match = finder.find(pos, max_length)
+
     return pos
 
 
-def handle_new_character(c: int, pos: int, in_buf: list[int],
-                         char_buf: deque[int], out: deque[LZSSNode]) -> int:
-    """ Handles a new character:
-        if there is a previous match, checks if the match can be elongated;
-        if not, checks if the new character can be matched separately.
-        Returns updated pos of a match.
+def estimate_prices(tokens: LZSSTokens) -> (list[float], list[float]):
+    """ Estimates the price in bits of every deflate symbol and distance code
+        from their frequencies in tokens.
     """
-    if pos >= 0:
-        char_buf.append(c)
-        new_pos = buffer_find(char_buf, in_buf, pos)
-        if new_pos >= 0:
-            return new_pos
+    # every symbol is counted at least once so none of them is free
+    sym_counts = [1]*288
+    dist_counts = [1]*32
+    for (length, value) in zip(tokens.lengths, tokens.values):
+        if length == 0:
+            sym_counts[value] += 1
         else:
-            char_buf.pop()
-            append_lzss_node(out, pos, char_buf, in_buf)
-            char_buf.clear()
-
-    char_buf.append(c)
-    pos = buffer_find(char_buf, in_buf)
-    if pos >= 0:
-        return pos
-    else:
-        append_chars(out, char_buf)
+            sym_counts[length.bit_length() + 255] += 1
+            dist_counts[value.bit_length()] += 1
+
+    sym_total = sum(sym_counts)
+    dist_total = sum(dist_counts)
+    return ([log2(sym_total / c) for c in sym_counts],
+            [log2(dist_total / c) for c in dist_counts])
+
+
+def optimal_parse(finder: HashChain, out: LZSSTokens, pos: int, end: int,
+                  max_length: int, prices: (list[float], list[float])) -> int:
+    """ Parses the window data from 'pos' to 'end' into out by choosing
+        the literals and matches which minimize the estimated price.
+        The cheapest way to reach every position is calculated from
+        the start to the end, and the resulting path is followed back
+        from the end. Matches do not continue past 'end'.
+        Returns the position where parsing stopped.
+    """
+    (sym_prices, dist_prices) = prices
+    start = pos
+    n = end - start
+    if n <= 0:
         return pos
+    cost = [0.0] + [float('inf')]*n
+    # (length, dist) of the step used to reach the position
+    steps = [(1, 0)]*(n+1)
+
+    def relax(i: int, length: int, dist: int):
+        length_bits = length.bit_length()
+        dist_bits = dist.bit_length()
+        price = cost[i] + sym_prices[length_bits+255] + length_bits + \
+            dist_prices[dist_bits] + dist_bits
+        if price < cost[i+length]:
+            cost[i+length] = price
+            steps[i+length] = (length, dist)
+
+    while pos < end:
+        i = pos - start
+        matches = finder.find_all(pos, min(max_length, end - pos))
+        finder.insert(pos)
+
+        price = cost[i] + sym_prices[finder.byte(pos)]
+        if price < cost[i+1]:
+            cost[i+1] = price
+            steps[i+1] = (1, 0)
+
+        # the longest match is good enough to be used as is
+        if len(matches) > 0 and matches[-1][0] >= finder.nice_length:
+            (length, dist) = matches[-1]
+            relax(i, length, dist)
+            for j in range(pos+1, pos+length):
+                finder.insert(j)
+            pos += length
+            continue
+
+        shorter = MIN_MATCH - 1
+        for (longest, dist) in matches:
+            for length in range(shorter+1, longest+1):
+                relax(i, length, dist)
+            shorter = longest
+
+        pos += 1
+
+    path = []
+    i = n
+    while i > 0:
+        path.append(steps[i])
+        i -= steps[i][0]
+
+    pos = start
+    for (length, dist) in reversed(path):
+        if dist == 0:
+            out.add_literal(finder.byte(pos))
+        else:
+            out.add_match(length, dist)
+        pos += length
+
+    return pos
 
 
-def to_lzss(in_arr: bytearray, buffer_size: int) -> deque[LZSSNode]:
-    """ Transforms input array into deque of LZSS nodes
+def rle_parse(data: bytearray, out: LZSSTokens, pos: int, end: int,
+              max_length: int) -> int:
+    """ Parses data from 'pos' to 'end' into out using only matches
+        at distance 1, ie. runs of the same byte. The runs are found
+        with a regular expression instead of the hash chains.
+        Returns the position where parsing stopped.
+    """
+    for run in RUN.finditer(data, pos, end):
+        # the first byte of the run is a literal and the rest repeat it
+        start = run.start() + 1
+        out.add_literals(data[pos:start])
+        pos = start
+        while run.end() - pos >= MIN_MATCH:
+            length = min(run.end() - pos, max_length)
+            out.add_match(length, 1)
+            pos += length
+    out.add_literals(data[pos:end])
+    return end
+
+
+class LZSSEncoder:
+    """ Transforms input into LZSS nodes one part at a time.
+        The history is kept between the parts, so matches can refer to
+        the data of the previous parts.
+    """
+    def __init__(self, buffer_size: int, level: int = DEFAULT_LEVEL,
+                 max_length: int = MAX_MATCH):
+        if level not in LEVELS:
+            e = f'Level has to be between 1 and 9, got {level}'
+            raise Exception(e)
+        (strategy, good_length, max_lazy, nice_length, max_chain) = \
+            LEVELS[level]
+        self.strategy = strategy
+        self.max_lazy = max_lazy
+        self.buffer_size = buffer_size
+        self.max_length = max_length
+        self.finder = HashChain(buffer_size, max_chain,
+                                good_length, nice_length)
+        # for optimal parsing, the prices are estimated
+        # from a greedy parsing of the same input
+        self.pricing = None
+        if strategy == 'optimal':
+            self.pricing = HashChain(buffer_size, max_chain,
+                                     good_length, nice_length)
+        self.pos = 0
+        self.price_pos = 0
+        # the first positions of the finders given to unparsed which have
+        # not been added to the hash chains, or None
+        self.skipped = None
+
+    def prime(self, dictionary: bytearray):
+        """ Adds the last buffer_size bytes of dictionary to the history
+            without encoding them, so that the following data
+            can refer to them. Has to be called before encoding.
+        """
+        if self.pos > 0:
+            e = 'Dictionary has to be added before encoding'
+            raise Exception(e)
+        dictionary = memoryview(dictionary)[-self.buffer_size:]
+        for finder in [self.finder, self.pricing]:
+            if finder is not None:
+                finder.feed(dictionary, 0)
+                for i in range(0, finder.end):
+                    finder.insert(i)
+        self.pos = len(dictionary)
+        self.price_pos = len(dictionary)
+
+    def copy(self) -> 'LZSSEncoder':
+        """ Returns a copy of the encoder and its history, eg. to encode
+            many inputs with the same dictionary without priming it again.
+        """
+        other = copy(self)
+        other.finder = self.finder.copy()
+        if self.pricing is not None:
+            other.pricing = self.pricing.copy()
+        return other
+
+    def checkpoint(self, n: int) -> tuple:
+        """ Returns the state needed by rollback to undo encoding at most
+            n more bytes, or None if the input is too long for that.
+            This is cheaper than copy for small inputs.
+        """
+        if self.skipped is not None:
+            return None
+        finder_state = self.finder.checkpoint(self.pos, n)
+        pricing_state = None
+        if self.pricing is not None:
+            pricing_state = self.pricing.checkpoint(self.price_pos, n)
+            if pricing_state is None:
+                return None
+        if finder_state is None:
+            return None
+        return (self.pos, self.price_pos, finder_state, pricing_state)
+
+    def rollback(self, state: tuple):
+        """ Returns the encoder and its history to the state of checkpoint
+        """
+        (self.pos, self.price_pos, finder_state, pricing_state) = state
+        self.finder.rollback(finder_state)
+        if self.pricing is not None:
+            self.pricing.rollback(pricing_state)
+
+    def history(self) -> bytes:
+        """ Returns the last buffer_size bytes given to the encoder,
+            which the next input can refer to.
+        """
+        finder = self.finder
+        start = max(finder.end - self.buffer_size, finder.base)
+        return bytes(finder.window[start-finder.base:finder.end-finder.base])
+
+    def probes(self) -> int:
+        """ Returns the number of positions the match finders have compared
+        """
+        if self.pricing is None:
+            return self.finder.probes
+        return self.finder.probes + self.pricing.probes
+
+    def encode(self, in_arr: bytearray, flush: bool = True) -> LZSSTokens:
+        """ Transforms in_arr into LZSS tokens. Unless flush is true,
+            the last bytes are left to be parsed in the next call,
+            so that matches can continue to the next part.
+        """
+        out = LZSSTokens()
+        in_view = memoryview(in_arr)
+        starts = range(0, len(in_arr), self.buffer_size)
+        for start in starts if len(in_arr) > 0 else [0]:
+            block = in_view[start:start+self.buffer_size]
+            self.finder.feed(block, self.pos)
+            if self.pricing is not None:
+                self.pricing.feed(block, self.price_pos)
+            self.insert_skipped()
+            # leave room for the longest match unless this is the last block
+            end = self.finder.end
+            if not flush or start + self.buffer_size < len(in_arr):
+                end -= self.max_length
+            self.parse(out, end)
+
+        return out
+
+    def unparsed(self, in_arr: bytearray):
+        """ Adds in_arr to the history without looking for matches.
+            Yields the (start, end) window indices of the data that has
+            not been parsed yet, first with the lookahead of the previous
+            call. The positions are added to the hash chains only when
+            the encoding with matches continues, see insert_skipped.
+        """
+        if self.skipped is None:
+            self.skipped = (self.pos, self.price_pos)
+        in_view = memoryview(in_arr)
+        starts = range(0, len(in_arr), self.buffer_size)
+        for start in starts if len(in_arr) > 0 else [0]:
+            block = in_view[start:start+self.buffer_size]
+            self.finder.feed(block, self.pos)
+            if self.pricing is not None:
+                self.pricing.feed(block, self.price_pos)
+            base = self.finder.base
+            yield (self.pos - base, self.finder.end - base)
+            self.pos = self.finder.end
+            self.price_pos = self.pos
+
+    def insert_skipped(self):
+        """ Adds the positions given to unparsed to the hash chains,
+            so that the following data can refer to them. Like zlib after
+            stored blocks, only the last buffer_size positions are added,
+            and only once before the next matches are searched for,
+            so a long run of skipped blocks costs nothing extra.
+        """
+        if self.skipped is None:
+            return
+        for (finder, start) in zip([self.finder, self.pricing], self.skipped):
+            if finder is not None:
+                for i in range(max(start, self.pos - self.buffer_size),
+                               self.pos):
+                    finder.insert(i)
+        self.skipped = None
+
+    def skip(self, in_arr: bytearray) -> bytearray:
+        """ Adds in_arr to the history without encoding it.
+            Returns the data that has not been encoded, ie. the lookahead
+            of the previous call followed by in_arr.
+        """
+        out = bytearray()
+        for (start, end) in self.unparsed(in_arr):
+            out += self.finder.window[start:end]
+        return out
+
+    def encode_literals(self, in_arr: bytearray) -> LZSSTokens:
+        """ Transforms in_arr into literals only, like zlib's
+            Z_HUFFMAN_ONLY strategy.
+        """
+        out = LZSSTokens()
+        for (start, end) in self.unparsed(in_arr):
+            out.add_literals(self.finder.window[start:end])
+        return out
+
+    def encode_runs(self, in_arr: bytearray) -> LZSSTokens:
+        """ Transforms in_arr into literals and matches at distance 1,
+            like zlib's Z_RLE strategy.
+        """
+        out = LZSSTokens()
+        for (start, end) in self.unparsed(in_arr):
+            rle_parse(self.finder.window, out, start, end, self.max_length)
+        return out
+
+    def parse(self, out: LZSSTokens, end: int):
+        """ Parses the window data until 'end' into out
+            using the parsing strategy of the level.
+        """
+        if self.strategy == 'greedy':
+            self.pos = greedy_parse(self.finder, out, self.pos, end,
+                                    self.max_length, self.max_lazy)
+        elif self.strategy == 'lazy':
+            self.pos = lazy_parse(self.finder, out, self.pos, end,
+                                  self.max_length, self.max_lazy)
+        else:
+            first_pass = LZSSTokens()
+            self.price_pos = greedy_parse(self.pricing, first_pass,
+                                          self.price_pos, end,
+                                          self.max_length, self.max_lazy)
+            self.pos = optimal_parse(self.finder, out, self.pos, end,
+                                     self.max_length,
+                                     estimate_prices(first_pass))
+
+
+def to_lzss(in_arr: bytearray, buffer_size: int, level: int = DEFAULT_LEVEL,
+            max_length: int = MAX_MATCH, zdict: bytes = None) -> LZSSTokens:
+    """ Transforms input array into LZSS tokens
         which are either literal characters or references to previous text.
+        Matches are searched with a hash chain and only matches
+        with 3 or longer len are used as references. The level (1-9)
+        chooses the parsing strategy and how hard matches are searched.
+        If a preset dictionary zdict is given, the references can also
+        point to it, and the same dictionary is needed for decoding.
     """
-    in_buf = []
-    out = deque()
-
-    char_buf = deque()
-    pos = -1
-    in_vals = deque(in_arr)
-
-    while len(in_vals) > 0:
-        c = in_vals.popleft()
-        pos = handle_new_character(c, pos, in_buf, char_buf, out)
-        in_buf.append(c)
-
-        if len(in_buf) == buffer_size:
-            in_buf = in_buf[1:]
-            pos -= 1
-            if pos < 0:
-                append_lzss_node(out, pos, char_buf, in_buf)
-                char_buf.clear()
-
-    if pos >= 0:
-        append_lzss_node(out, pos, char_buf, in_buf)
-
-    return out
-
-
-def parse_text(out: deque[LZSSNode], in_vals: deque[int], n_chars: int):
+    encoder = LZSSEncoder(buffer_size, level, max_length)
+    if zdict is not None:
+        encoder.prime(zdict)
+    return encoder.encode(in_arr)
+
+
+def build_dictionary(samples: list[bytes], size: int = 2**15,
+                     k: int = 6) -> bytes:
+    """ Builds a preset dictionary of at most size bytes from samples
+        of the data to be compressed. The k-byte substrings which occur in
+        the most samples are chained into longer strings where they overlap.
+        The most common strings are at the end of the dictionary,
+        so the references to them have the shortest distances.
+    """
+    # the number of samples each substring occurs in
+    sample_counts = {}
+    for sample in samples:
+        for gram in set(bytes(sample[i:i+k])
+                        for i in range(0, len(sample) - k + 1)):
+            sample_counts[gram] = sample_counts.get(gram, 0) + 1
+
+    min_count = min(2, len(samples))
+    grams = sorted((gram for (gram, count) in sample_counts.items()
+                    if count >= min_count),
+                   key=lambda gram: (-sample_counts[gram], gram))[:size]
+
+    # the grams by their first and last k-1 bytes, most common first
+    by_prefix = {}
+    by_suffix = {}
+    for gram in grams:
+        by_prefix.setdefault(gram[:-1], []).append(gram)
+        by_suffix.setdefault(gram[1:], []).append(gram)
+
+    def most_common(candidates: list[bytes]) -> bytes:
+        for gram in candidates:
+            if gram not in used:
+                return gram
+        return None
+
+    used = set()
+    pieces = []
+    for gram in grams:
+        if gram in used:
+            continue
+        used.add(gram)
+        piece = bytearray(gram)
+        # extend the piece with the grams that overlap its end or start
+        gram = most_common(by_prefix.get(bytes(piece[1-k:]), []))
+        while gram is not None:
+            used.add(gram)
+            piece.append(gram[-1])
+            gram = most_common(by_prefix.get(bytes(piece[1-k:]), []))
+        start = bytearray()
+        gram = most_common(by_suffix.get(bytes(piece[:k-1]), []))
+        while gram is not None:
+            used.add(gram)
+            start.append(gram[0])
+            gram = most_common(by_suffix.get(gram[:-1], []))
+        pieces.append(bytes(reversed(start)) + piece)
+
+    return b''.join(reversed(pieces))[-size:]
+
+
+def parse_text(out: LZSSTokens, in_vals: deque[int], n_chars: int):
     """ Reads n char amount of characters from input values
-        and transforms them into literal lzss nodes
-        and appends them into out.
+        and appends them into out as literal tokens.
     """
     for i in range(0, n_chars):
-        out.append(LZSSNode(char=in_vals.popleft()))
+        out.add_literal(in_vals.popleft())
 
 
-def parse_ref(out: deque[LZSSNode], in_vals: deque[int], length: int):
+def parse_ref(out: LZSSTokens, in_vals: deque[int], length: int):
     """ Reads distance of the match from input values
-        and appends the pair of length and distance as lzss nodes into out
+        and appends the pair of length and distance into out
     """
     dist = in_vals.popleft()
-    out.append(LZSSNode(length=length, dist=dist))
+    out.add_match(length, dist)
 
 
-def lzss_parse(in_arr: bytearray) -> deque[LZSSNode]:
+def lzss_parse(in_arr: bytearray) -> LZSSTokens:
     """ Parses encoded lzss data
-        and transforms them into deque of lzss nodes
+        and transforms them into lzss tokens
     """
-    out = deque()
+    out = LZSSTokens()
     in_vals = deque(in_arr)
     while len(in_vals) > 0:
         # parity of this tells whether the following is text or a ref
@@ -191,21 +777,50 @@ def lzss_parse(in_arr: bytearray) -> deque[LZSSNode]:
     return out
 
 
-def lzss_to_decrypted(in_nodes: deque[LZSSNode]) -> bytearray:
-    """ takes lzss nodes as input and transforms them into
-        original bytearray
+def lzss_to_decrypted(tokens: LZSSTokens, zdict: bytes = b'') -> bytearray:
+    """ takes lzss tokens as input and transforms them into
+        original bytearray. zdict is the preset dictionary
+        the tokens were encoded with.
     """
-    out = bytearray()
-    while len(in_nodes) > 0:
-        node = in_nodes.popleft()
-        if node.is_literal():
-            out.append(node.char)
+    lengths = tokens.lengths
+    # the length of the output is known, so it is allocated at once
+    out = bytearray(zdict) + bytearray(sum(lengths) + lengths.count(0))
+    pos = len(zdict)
+    for (length, value) in zip(lengths, tokens.values):
+        if length == 0:
+            out[pos] = value
+            pos += 1
         else:
-            n = len(out)
-            for i in range(0, node.length):
-                out.append(out[n-node.dist+i])
+            copy_match(out, pos, length, value)
+            pos += length
 
-    return out
+    return out[len(zdict):] if len(zdict) > 0 else out
+
+
+def copy_match(out: bytearray, pos: int, length: int, dist: int):
+    """ Copies length bytes to out[pos:] from dist bytes before pos.
+        If the match overlaps itself (dist < length), the bytes that have
+        already been copied are copied again, which doubles
+        the copied part every time.
+    """
+    start = pos - dist
+    end = pos + length
+    while pos < end:
+        n = min(end - pos, pos - start)
+        out[pos:pos+n] = out[start:start+n]
+        pos += n
+
+
+def append_match(out: bytearray, length: int, dist: int):
+    """ Appends length bytes to out by copying them
+        from dist bytes before the end of out.
+        Overlapping matches are copied like in copy_match.
+    """
+    start = len(out) - dist
+    while length > 0:
+        n = min(length, len(out) - start)
+        out += out[start:start+n]
+        length -= n
 
 
 def append_with_len(out: bytearray(), in_vals: deque[int]):
@@ -219,22 +834,21 @@ def append_with_len(out: bytearray(), in_vals: deque[int]):
             out.append(in_vals.popleft())
 
 
-def lzss_to_encrypted(in_nodes: deque[LZSSNode]) -> bytearray:
-    """ Takes lzss nodes as input and transforms them into
+def lzss_to_encrypted(tokens: LZSSTokens) -> bytearray:
+    """ Takes lzss tokens as input and transforms them into
         lzss encoded bytearray
     """
     out = bytearray()
     in_vals = deque()
-    for node in in_nodes:
-        if node.is_literal():
-            (val, none) = node.value()
-            in_vals.append(val)
+    for (length, value) in zip(tokens.lengths, tokens.values):
+        if length == 0:
+            in_vals.append(value)
         else:
             if len(in_vals) > 0:
                 append_with_len(out, in_vals)
 
-            out.append(node.length*2+1)
-            out.append(node.dist)
+            out.append(length*2+1)
+            out.append(value)
 
     if len(in_vals) > 0:
         append_with_len(out, in_vals)
@@ -242,10 +856,12 @@ def lzss_to_encrypted(in_nodes: deque[LZSSNode]) -> bytearray:
     return out
 
 
-def lzss_encode(in_arr: bytearray, buffer_size: int = 2**8) -> bytearray:
+def lzss_encode(in_arr: bytearray, buffer_size: int = 2**8,
+                level: int = DEFAULT_LEVEL) -> bytearray:
     """ Encodes the input string using LZSS Encoding.
     """
-    lzss_lst = to_lzss(in_arr, buffer_size)
+    # the length and the distance are both stored in a single byte
+    lzss_lst = to_lzss(in_arr, buffer_size, level, max_length=127)
     return lzss_to_encrypted(lzss_lst)
 
 
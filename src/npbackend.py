@@ -0,0 +1,92 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy is used only for inputs of at least this many symbols,
+# smaller ones are faster to handle in pure Python
+MIN_SYMBOLS = 4096
+# the number of symbols packed at a time, which limits the memory
+# of the temporary bit arrays
+CHUNK_SYMBOLS = 2**20
+
+
+def enabled(n_symbols: int) -> bool:
+    """ Returns whether NumPy is installed and worth using
+        for n_symbols symbols.
+    """
+    return np is not None and n_symbols >= MIN_SYMBOLS
+
+
+def byte_counts(data: bytearray, n_values: int) -> list[int]:
+    """ Counts how many times each byte appears in data,
+        the result has n_values counts.
+    """
+    return np.bincount(np.frombuffer(data, dtype=np.uint8),
+                       minlength=n_values).tolist()
+
+
+def canonical_code_values(code_lens: list[int]) -> list[int]:
+    """ Calculates the canonical Huffman codes of the code lengths like
+        code_values(canonical_huffcode(code_lens)): the bits of each code
+        are reversed, so that BitWriter writes the first bit first.
+    """
+    lens = np.asarray(code_lens, dtype=np.int64)
+    values = np.zeros(len(lens), dtype=np.int64)
+    max_len = int(lens.max()) if len(lens) > 0 else 0
+    if max_len == 0:
+        return values.tolist()
+
+    # the first code of each length as in RFC 1951
+    len_counts = np.bincount(lens, minlength=max_len + 1)
+    len_counts[0] = 0
+    next_code = np.zeros(max_len + 1, dtype=np.int64)
+    code = 0
+    for bits in range(1, max_len + 1):
+        code = (code + int(len_counts[bits - 1])) << 1
+        next_code[bits] = code
+
+    # the codes of the same length are consecutive in the symbol order
+    syms = np.nonzero(lens)[0]
+    order = syms[np.argsort(lens[syms], kind='stable')]
+    sorted_lens = lens[order]
+    first = np.searchsorted(sorted_lens, sorted_lens, side='left')
+    codes = next_code[sorted_lens] + np.arange(len(order)) - first
+
+    reversed_codes = np.zeros_like(codes)
+    for bit in range(0, max_len):
+        shift = sorted_lens - 1 - bit
+        reversed_codes |= np.where(shift >= 0, ((codes >> bit) & 1) <<
+                                   np.maximum(shift, 0), 0)
+    values[order] = reversed_codes
+    return values.tolist()
+
+
+def pack_codes(symbols, code_values: list[int],
+               code_lens: list[int]) -> (bytes, int, int):
+    """ Packs the codes of the symbols least significant bit first like
+        BitWriter. The bits of every code are expanded into a row once,
+        and the rows of the symbols are gathered and packed with
+        np.packbits. Returns the complete bytes and the value and
+        the number of bits of the incomplete last byte.
+    """
+    values = np.asarray(code_values, dtype=np.uint16)
+    lens = np.asarray(code_lens, dtype=np.uint16)
+    bit_index = np.arange(max(int(lens.max()), 1), dtype=np.uint16)
+    # the bits of each code and which of them are used
+    rows = ((values[:, None] >> bit_index) & 1).astype(np.uint8)
+    used = bit_index < lens[:, None]
+
+    out = bytearray()
+    carry = np.zeros(0, dtype=np.uint8)
+    for start in range(0, len(symbols), CHUNK_SYMBOLS):
+        chunk = symbols[start:start+CHUNK_SYMBOLS]
+        stream = np.concatenate([carry, rows[chunk][used[chunk]]])
+        n_full = len(stream) // 8 * 8
+        out += np.packbits(stream[:n_full], bitorder='little').tobytes()
+        carry = stream[n_full:]
+
+    rest = 0
+    for (i, bit) in enumerate(carry.tolist()):
+        rest |= bit << i
+    return (bytes(out), rest, len(carry))
@@ -0,0 +1,100 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from blockindex import read_index
+from deflate import WINDOW_SIZE, Decompressor, parse_blocks
+from lzss import LZSSTokens, lzss_to_decrypted
+from stats import Stats, timer
+
+
+def decode_part(data: bytes, zdict: bytes,
+                stats: Stats = None) -> (bytearray, Stats):
+    """ Decompresses blocks which do not refer to the data before them
+    """
+    return (Decompressor('defl', stats, zdict).decompress(data), stats)
+
+
+def parse_part(data: bytes, stats: Stats = None) -> (LZSSTokens, Stats):
+    """ Parses the LZSS tokens of blocks
+    """
+    with timer(stats, 'parse'):
+        tokens = parse_blocks(data)
+    if stats is not None:
+        stats.input_bytes += len(data)
+        stats.count_tokens(tokens)
+    return (tokens, stats)
+
+
+class ParallelDecompressor:
+    """ Decompresses a defl file that ends with an index, like the files
+        of SeekableCompressor and ParallelCompressor, with a pool of worker
+        processes. The parts between sync points are decompressed by
+        the workers independently. The blocks of a block index can refer
+        to the previous blocks, so the workers only parse their tokens,
+        and the tokens are turned into data in order, every block getting
+        the last WINDOW_SIZE bytes of the previous ones as its dictionary.
+    """
+    def __init__(self, f, jobs: int = 2, stats: Stats = None,
+                 zdict: bytes = None):
+        self.f = f
+        self.jobs = jobs
+        self.stats = stats
+        self.zdict = zdict
+        (self.index, self.sync_points) = read_index(f)
+        self.window = b'' if zdict is None else bytes(zdict[-WINDOW_SIZE:])
+
+    def size(self) -> int:
+        """ Returns the length of the uncompressed data
+        """
+        return self.index[-1][0]
+
+    def submit(self, executor: ProcessPoolExecutor, data: bytes,
+               first: bool):
+        """ Gives the compressed data between two index entries
+            to the workers
+        """
+        stats = None if self.stats is None else Stats()
+        if self.sync_points:
+            return executor.submit(decode_part, data,
+                                   self.zdict if first else None, stats)
+        return executor.submit(parse_part, data, stats)
+
+    def finish(self, future) -> bytearray:
+        """ Returns the data of a part when its worker is done
+        """
+        (result, stats) = future.result()
+        if stats is not None:
+            self.stats.merge(stats)
+        if self.sync_points:
+            return result
+
+        with timer(self.stats, 'resolve'):
+            out = lzss_to_decrypted(result, self.window)
+        self.window = (self.window + out)[-WINDOW_SIZE:]
+        if self.stats is not None:
+            self.stats.output_bytes += len(out)
+        return out
+
+    def decompress(self):
+        """ Yields the decompressed data in order, part by part
+        """
+        size = 0
+        futures = deque()
+        with ProcessPoolExecutor(self.jobs) as executor:
+            self.f.seek(0)
+            for ((_, start), (_, end)) in zip(self.index, self.index[1:]):
+                data = self.f.read(end - start)
+                futures.append(self.submit(executor, data, start == 0))
+                # limit the amount of data waiting for the workers
+                while len(futures) > 2*self.jobs:
+                    out = self.finish(futures.popleft())
+                    size += len(out)
+                    yield out
+
+            while len(futures) > 0:
+                out = self.finish(futures.popleft())
+                size += len(out)
+                yield out
+
+        if size != self.size():
+            e = 'Unexpected end of data'
+            raise Exception(e)
@@ -0,0 +1,479 @@
+from zlib import adler32, crc32
+from helpers import BitReader, BitWriter
+from huffman import (
+    TABLE_CACHE, canonical_huffcode, code_values, decode_table,
+    limited_code_lens, read_code
+)
+from lzss import LZSSTokens
+from stats import Stats, timer
+
+# Block types
+BLOCK_STORED = 0
+BLOCK_FIXED = 1
+BLOCK_DYNAMIC = 2
+
+# Length codes 257-285 and distance codes 0-29:
+# the value is the base plus the extra bits that follow the code
+LENGTH_BASE = [3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31,
+               35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258]
+LENGTH_EXTRA = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+                3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0]
+DIST_BASE = [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193,
+             257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145,
+             8193, 12289, 16385, 24577]
+DIST_EXTRA = [0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+              7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]
+
+# The order in which the code lengths of the code length code are stored
+CODE_LENGTH_ORDER = [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2,
+                     14, 1, 15]
+
+# the estimated cost of a block header in bits
+# as (bits per block, bits per used symbol)
+HEADER_BITS = (20, 3)
+# the longest data of a stored block
+MAX_STORED = 2**16 - 1
+
+FIXED_LIT_LENS = [8]*144 + [9]*112 + [7]*24 + [8]*8
+FIXED_DIST_LENS = [5]*32
+
+
+def length_codes() -> list[int]:
+    """ Maps every match length (3-258) to the index of its length code.
+    """
+    codes = [0]*259
+    for i in range(0, len(LENGTH_BASE)):
+        for length in range(LENGTH_BASE[i],
+                            min(LENGTH_BASE[i] + 2**LENGTH_EXTRA[i], 259)):
+            codes[length] = i
+    # 258 could also be written with code 284, but it has its own code
+    codes[258] = len(LENGTH_BASE) - 1
+    return codes
+
+
+def dist_codes() -> list[int]:
+    """ Maps distances to their distance codes like zlib: distances up to
+        256 are at index dist-1 and the longer ones at 256+(dist-1)//128.
+    """
+    codes = [0]*512
+    for i in range(0, len(DIST_BASE)):
+        for dist in range(DIST_BASE[i], DIST_BASE[i] + 2**DIST_EXTRA[i]):
+            if dist <= 256:
+                codes[dist-1] = i
+            else:
+                codes[256 + ((dist-1) >> 7)] = i
+    return codes
+
+
+LENGTH_CODES = length_codes()
+DIST_CODES = dist_codes()
+FIXED_LIT_CODES = (FIXED_LIT_LENS,
+                   code_values(canonical_huffcode(FIXED_LIT_LENS)))
+FIXED_DIST_CODES = (FIXED_DIST_LENS,
+                    code_values(canonical_huffcode(FIXED_DIST_LENS)))
+FIXED_TABLES = (decode_table(FIXED_LIT_LENS), decode_table(FIXED_DIST_LENS))
+
+
+def dist_code(dist: int) -> int:
+    """ Returns the distance code of the distance
+    """
+    if dist <= 256:
+        return DIST_CODES[dist-1]
+    return DIST_CODES[256 + ((dist-1) >> 7)]
+
+
+def token_symbols(tokens: LZSSTokens) -> (list[int], list[int]):
+    """ Returns the literal/length symbols and the distance codes of
+        the tokens. The distance code of a literal is -1.
+    """
+    lit_syms = [value if length == 0 else 257 + LENGTH_CODES[length]
+                for (length, value) in zip(tokens.lengths, tokens.values)]
+    dist_syms = [-1 if length == 0 else dist_code(value)
+                 for (length, value) in zip(tokens.lengths, tokens.values)]
+    return (lit_syms, dist_syms)
+
+
+def ensure_two_codes(count_list: list[int]):
+    """ Gives a count to unused symbols until at least two symbols
+        are used, since decoders expect complete codes.
+    """
+    used = len(count_list) - count_list.count(0)
+    i = 0
+    while used < 2:
+        if count_list[i] == 0:
+            count_list[i] = 1
+            used += 1
+        i += 1
+
+
+def rle_code_lens(code_lens: list[int]) -> list[(int, int, int)]:
+    """ Run-length encodes code lengths with the code length alphabet.
+        Returns (symbol, extra bits value, number of extra bits) triples:
+        16 repeats the previous length 3-6 times, 17 repeats zero 3-10 times
+        and 18 repeats zero 11-138 times.
+    """
+    out = []
+    i = 0
+    while i < len(code_lens):
+        code_len = code_lens[i]
+        run = 1
+        while i + run < len(code_lens) and code_lens[i+run] == code_len:
+            run += 1
+        i += run
+
+        if code_len == 0:
+            while run >= 11:
+                n = min(run, 138)
+                out.append((18, n - 11, 7))
+                run -= n
+            if run >= 3:
+                out.append((17, run - 3, 3))
+                run = 0
+        else:
+            out.append((code_len, 0, 0))
+            run -= 1
+            while run >= 3:
+                n = min(run, 6)
+                out.append((16, n - 3, 2))
+                run -= n
+        out += [(code_len, 0, 0)]*run
+
+    return out
+
+
+def dynamic_header(lit_lens: list[int],
+                   dist_lens: list[int]) -> (int, int, int, list, list):
+    """ Returns the header of a dynamic block: the numbers of the literal,
+        distance and code length codes, the lengths of the code length
+        code and the run-length encoded code lengths.
+    """
+    hlit = 286
+    while hlit > 257 and lit_lens[hlit-1] == 0:
+        hlit -= 1
+    hdist = 30
+    while hdist > 1 and dist_lens[hdist-1] == 0:
+        hdist -= 1
+
+    rle = rle_code_lens(lit_lens[:hlit] + dist_lens[:hdist])
+    cl_counts = [0]*19
+    for (sym, extra, n_bits) in rle:
+        cl_counts[sym] += 1
+    ensure_two_codes(cl_counts)
+    cl_lens = limited_code_lens(cl_counts, 7)
+
+    hclen = 19
+    while hclen > 4 and cl_lens[CODE_LENGTH_ORDER[hclen-1]] == 0:
+        hclen -= 1
+    return (hlit, hdist, hclen, cl_lens, rle)
+
+
+def header_bits(header: (int, int, int, list, list)) -> int:
+    """ Returns the size of a dynamic header in bits
+    """
+    (hlit, hdist, hclen, cl_lens, rle) = header
+    return 14 + 3*hclen + sum(cl_lens[sym] + n_bits
+                              for (sym, extra, n_bits) in rle)
+
+
+def write_dynamic_header(header: (int, int, int, list, list),
+                         out: BitWriter):
+    """ Writes the code lengths of a dynamic block
+        using the code length code.
+    """
+    (hlit, hdist, hclen, cl_lens, rle) = header
+    cl_values = code_values(canonical_huffcode(cl_lens))
+    out.write(hlit - 257, 5)
+    out.write(hdist - 1, 5)
+    out.write(hclen - 4, 4)
+    for i in range(0, hclen):
+        out.write(cl_lens[CODE_LENGTH_ORDER[i]], 3)
+    for (sym, extra, n_bits) in rle:
+        out.write(cl_values[sym], cl_lens[sym])
+        out.write(extra, n_bits)
+
+
+def write_tokens(tokens: LZSSTokens, lit_codes: (list[int], list[int]),
+                 dist_codes: (list[int], list[int]), out: BitWriter):
+    """ Writes LZSS tokens and the end of block code using the given
+        (code lengths, code values) pairs.
+    """
+    (lit_lens, lit_values) = lit_codes
+    (dist_lens, dist_values) = dist_codes
+    for (length, value) in zip(tokens.lengths, tokens.values):
+        if length == 0:
+            out.write(lit_values[value], lit_lens[value])
+        else:
+            i = LENGTH_CODES[length]
+            out.write(lit_values[257+i], lit_lens[257+i])
+            out.write(length - LENGTH_BASE[i], LENGTH_EXTRA[i])
+            d = dist_code(value)
+            out.write(dist_values[d], dist_lens[d])
+            out.write(value - DIST_BASE[d], DIST_EXTRA[d])
+    out.write(lit_values[256], lit_lens[256])
+
+
+def write_block(tokens: LZSSTokens, out: BitWriter, final: bool,
+                stats: Stats = None):
+    """ Writes LZSS tokens as a fixed or a dynamic Huffman block,
+        whichever is smaller. The block does not end at a byte boundary.
+    """
+    with timer(stats, 'huffman'):
+        lit_counts = [0]*286
+        dist_counts = [0]*30
+        extra_bits = 0
+        lit_counts[256] = 1
+        for (length, value) in zip(tokens.lengths, tokens.values):
+            if length == 0:
+                lit_counts[value] += 1
+            else:
+                i = LENGTH_CODES[length]
+                d = dist_code(value)
+                lit_counts[257+i] += 1
+                dist_counts[d] += 1
+                extra_bits += LENGTH_EXTRA[i] + DIST_EXTRA[d]
+
+        ensure_two_codes(lit_counts)
+        ensure_two_codes(dist_counts)
+        lit_lens = limited_code_lens(lit_counts)
+        dist_lens = limited_code_lens(dist_counts)
+
+    def data_bits(lit_lens: list[int], dist_lens: list[int]) -> int:
+        return sum(c*l for (c, l) in zip(lit_counts, lit_lens)) + \
+            sum(c*l for (c, l) in zip(dist_counts, dist_lens)) + extra_bits
+
+    start = out.bit_pos()
+    with timer(stats, 'header'):
+        header = dynamic_header(lit_lens, dist_lens)
+        dynamic = header_bits(header) + data_bits(lit_lens, dist_lens) < \
+            data_bits(FIXED_LIT_LENS, FIXED_DIST_LENS)
+
+        out.write(final, 1)
+        if dynamic:
+            out.write(BLOCK_DYNAMIC, 2)
+            write_dynamic_header(header, out)
+        else:
+            out.write(BLOCK_FIXED, 2)
+    header_end = out.bit_pos()
+
+    with timer(stats, 'canonical'):
+        if dynamic:
+            lit_codes = (lit_lens, code_values(canonical_huffcode(lit_lens)))
+            dist_codes = (dist_lens,
+                          code_values(canonical_huffcode(dist_lens)))
+        else:
+            (lit_codes, dist_codes) = (FIXED_LIT_CODES, FIXED_DIST_CODES)
+
+    with timer(stats, 'bits'):
+        write_tokens(tokens, lit_codes, dist_codes, out)
+
+    if stats is not None:
+        stats.blocks += 1
+        stats.header_bits += header_end - start
+        stats.payload_bits += out.bit_pos() - header_end
+
+
+def write_stored(data: bytearray, out: BitWriter, final: bool,
+                 stats: Stats = None):
+    """ Writes data as stored blocks of at most MAX_STORED bytes.
+        The length of a stored block starts at a byte boundary.
+    """
+    starts = range(0, len(data), MAX_STORED)
+    for start in starts if len(data) > 0 else [0]:
+        chunk = data[start:start+MAX_STORED]
+        begin = out.bit_pos()
+        out.write(final and start + MAX_STORED >= len(data), 1)
+        out.write(BLOCK_STORED, 2)
+        out.align()
+        out.write(len(chunk), 16)
+        out.write(len(chunk) ^ 0xffff, 16)
+        header_end = out.bit_pos()
+        out.write_bytes(chunk)
+
+        if stats is not None:
+            stats.blocks += 1
+            stats.header_bits += header_end - begin
+            stats.payload_bits += out.bit_pos() - header_end
+
+
+def cached_table(code_lens: list[int]) -> (int, list):
+    """ Returns the decoding table of the code lengths from the cache
+    """
+    return TABLE_CACHE.get(('lens', bytes(code_lens)), lambda: code_lens)
+
+
+def read_dynamic_tables(in_bits: BitReader) -> ((int, list), (int, list)):
+    """ Reads the code lengths of a dynamic block.
+        Returns the lookup tables of the literal/length and distance codes.
+    """
+    hlit = in_bits.read(5) + 257
+    hdist = in_bits.read(5) + 1
+    hclen = in_bits.read(4) + 4
+    cl_lens = [0]*19
+    for i in range(0, hclen):
+        cl_lens[CODE_LENGTH_ORDER[i]] = in_bits.read(3)
+    cl_table = cached_table(cl_lens)
+
+    code_lens = []
+    while len(code_lens) < hlit + hdist:
+        sym = read_code(in_bits, cl_table)
+        if sym < 16:
+            code_lens.append(sym)
+        elif sym == 16:
+            if len(code_lens) == 0:
+                e = 'No code length to repeat'
+                raise Exception(e)
+            code_lens += [code_lens[-1]]*(3 + in_bits.read(2))
+        elif sym == 17:
+            code_lens += [0]*(3 + in_bits.read(3))
+        else:
+            code_lens += [0]*(11 + in_bits.read(7))
+
+    if len(code_lens) > hlit + hdist:
+        e = 'Too many code lengths'
+        raise Exception(e)
+    return (cached_table(code_lens[:hlit]), cached_table(code_lens[hlit:]))
+
+
+def read_block_header(in_bits: BitReader) -> (bool, (int, list), object):
+    """ Reads the header of a block. Returns (final, literal/length table,
+        distance table) for Huffman blocks and (final, None, length)
+        for stored blocks.
+    """
+    final = in_bits.read(1) == 1
+    block_type = in_bits.read(2)
+    if block_type == BLOCK_STORED:
+        in_bits.align()
+        length = in_bits.read(16)
+        if in_bits.read(16) != length ^ 0xffff:
+            e = 'Invalid length of a stored block'
+            raise Exception(e)
+        return (final, None, length)
+    elif block_type == BLOCK_FIXED:
+        return (final, FIXED_TABLES[0], FIXED_TABLES[1])
+    elif block_type == BLOCK_DYNAMIC:
+        (lit_table, dist_table) = read_dynamic_tables(in_bits)
+        return (final, lit_table, dist_table)
+    else:
+        e = f'Unknown block type {block_type}'
+        raise Exception(e)
+
+
+def initial_checksum(fmt: str) -> int:
+    """ Returns the checksum of empty data for the container format
+    """
+    return 1 if fmt == 'zlib' else 0
+
+
+def update_checksum(fmt: str, checksum: int, data: bytearray) -> int:
+    """ Updates the checksum of the container format (Adler-32 for zlib
+        and CRC-32 for gzip) with data.
+    """
+    if fmt == 'zlib':
+        return adler32(data, checksum)
+    elif fmt == 'gzip':
+        return crc32(data, checksum)
+    return checksum
+
+
+def container_header(fmt: str, level: int, zdict: bytes = None) -> bytes:
+    """ Returns the header of a zlib (RFC 1950) or gzip (RFC 1952) stream.
+        Raw deflate streams have no header. A zlib stream compressed with
+        a preset dictionary zdict stores the Adler-32 checksum of it.
+    """
+    if fmt == 'zlib':
+        # deflate with 32 KiB window, the level is only informative
+        cmf = 0x78
+        flg = (0 if level == 1 else 1 if level < 6 else 2 if level == 6
+               else 3) << 6
+        if zdict is not None:
+            flg |= 0x20
+        flg += (31 - (cmf*256 + flg) % 31) % 31
+        if zdict is not None:
+            return bytes([cmf, flg]) + adler32(zdict).to_bytes(4, 'big')
+        return bytes([cmf, flg])
+    elif fmt == 'gzip':
+        if zdict is not None:
+            e = 'gzip does not support preset dictionaries'
+            raise Exception(e)
+        # no file name or modification time, unknown OS
+        xfl = 2 if level == 9 else 4 if level == 1 else 0
+        return bytes([0x1f, 0x8b, 8, 0, 0, 0, 0, 0, xfl, 255])
+    return b''
+
+
+def container_trailer(fmt: str, checksum: int, size: int) -> bytes:
+    """ Returns the trailer of a zlib or gzip stream
+    """
+    if fmt == 'zlib':
+        return checksum.to_bytes(4, 'big')
+    elif fmt == 'gzip':
+        return checksum.to_bytes(4, 'little') + \
+            (size & 0xffffffff).to_bytes(4, 'little')
+    return b''
+
+
+def skip_zero_terminated(in_bits: BitReader):
+    """ Skips a zero-terminated string
+    """
+    while in_bits.read(8) != 0:
+        pass
+
+
+def read_container_header(in_bits: BitReader, fmt: str,
+                          zdict: bytes = None):
+    """ Reads and checks the header of a zlib or gzip stream.
+        If the zlib stream needs a preset dictionary, it has to be zdict.
+    """
+    if fmt == 'zlib':
+        cmf = in_bits.read(8)
+        flg = in_bits.read(8)
+        if cmf & 0x0f != 8 or (cmf*256 + flg) % 31 != 0:
+            e = 'Invalid zlib header'
+            raise Exception(e)
+        if flg & 0x20:
+            dict_id = int.from_bytes(in_bits.read(32).to_bytes(4, 'little'),
+                                     'big')
+            if zdict is None:
+                e = 'Preset dictionary is needed'
+                raise Exception(e)
+            if dict_id != adler32(zdict):
+                e = 'Preset dictionary does not match'
+                raise Exception(e)
+    elif fmt == 'gzip':
+        if in_bits.read(16) != 0x8b1f or in_bits.read(8) != 8:
+            e = 'Invalid gzip header'
+            raise Exception(e)
+        flg = in_bits.read(8)
+        # modification time, extra flags and OS
+        in_bits.read(48)
+        if flg & 4:
+            xlen = in_bits.read(16)
+            for i in range(0, xlen):
+                in_bits.read(8)
+        if flg & 8:
+            skip_zero_terminated(in_bits)
+        if flg & 16:
+            skip_zero_terminated(in_bits)
+        if flg & 2:
+            in_bits.read(16)
+
+
+def read_container_trailer(in_bits: BitReader, fmt: str,
+                           checksum: int, size: int):
+    """ Reads the trailer of a zlib or gzip stream and checks that
+        it matches the checksum and the size of the decompressed data.
+    """
+    in_bits.align()
+    if fmt == 'zlib':
+        expected = int.from_bytes(in_bits.read(32).to_bytes(4, 'little'),
+                                  'big')
+        if expected != checksum:
+            e = 'Adler-32 checksum does not match'
+            raise Exception(e)
+    elif fmt == 'gzip':
+        if in_bits.read(32) != checksum:
+            e = 'CRC-32 checksum does not match'
+            raise Exception(e)
+        if in_bits.read(32) != size & 0xffffffff:
+            e = 'Size of the data does not match'
+            raise Exception(e)
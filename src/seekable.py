@@ -0,0 +1,131 @@
+from bisect import bisect_left, bisect_right
+from blockindex import index_to_bytes, read_index
+from deflate import BLOCK_SIZE, Compressor, Decompressor
+from lzss import DEFAULT_LEVEL
+from stats import Stats
+
+# the history is reset every SYNC_INTERVAL bytes of input by default
+SYNC_INTERVAL = 2**18
+# the compressed data is read in parts of this size
+READ_SIZE = 2**16
+
+
+class SeekableCompressor:
+    """ Compresses data like Compressor in the defl format, but starts
+        a new history every sync_interval bytes of input. After the last
+        block comes an index of these sync points, so that a range of
+        the data can be decompressed starting from the nearest sync point.
+        The normal decompression ignores the index. The preset dictionary
+        zdict is used only before the first sync point.
+    """
+    def __init__(self, level: int = DEFAULT_LEVEL,
+                 block_size: int = BLOCK_SIZE,
+                 sync_interval: int = SYNC_INTERVAL, stats: Stats = None,
+                 zdict: bytes = None, strategy: str = 'auto'):
+        if sync_interval <= 0:
+            e = f'Sync interval has to be positive, got {sync_interval}'
+            raise Exception(e)
+        self.compressor = Compressor(level, block_size, 'defl', stats, zdict,
+                                     strategy)
+        self.sync_interval = sync_interval
+        # (uncompressed offset, compressed offset) of every sync point
+        self.index = [(0, 0)]
+        self.in_size = 0
+        self.out_size = 0
+
+    def compress(self, chunk: bytearray) -> bytearray:
+        """ Compresses a chunk of data. Returns the compressed blocks
+            that are ready, the rest of the data is kept for later calls.
+        """
+        out = bytearray()
+        chunk = memoryview(chunk)
+        while len(chunk) > 0:
+            next_sync = self.index[-1][0] + self.sync_interval
+            n = min(len(chunk), next_sync - self.in_size)
+            out += self.compressor.compress(chunk[:n])
+            self.in_size += n
+            chunk = chunk[n:]
+            if self.in_size == next_sync:
+                out += self.compressor.sync()
+                self.index.append((self.in_size, self.out_size + len(out)))
+
+        self.out_size += len(out)
+        return out
+
+    def flush(self) -> bytearray:
+        """ Compresses the rest of the data and ends the stream
+            with the last block and the index.
+        """
+        out = self.compressor.flush()
+        self.out_size += len(out)
+        self.index.append((self.in_size, self.out_size))
+        return out + index_to_bytes(self.index)
+
+
+class SeekableReader:
+    """ Reads ranges of the uncompressed data from a seekable file opened
+        in binary mode. Only the blocks between the sync points around
+        the range are read and decompressed. zdict is the preset dictionary
+        of the data before the first sync point.
+    """
+    def __init__(self, f, stats: Stats = None, zdict: bytes = None):
+        self.f = f
+        self.stats = stats
+        self.zdict = zdict
+        (self.index, sync_points) = read_index(f)
+        if not sync_points:
+            e = 'The index of the file has no sync points'
+            raise Exception(e)
+        self.offsets = [in_offset for (in_offset, _) in self.index]
+
+    def size(self) -> int:
+        """ Returns the length of the uncompressed data
+        """
+        return self.index[-1][0]
+
+    def read_parts(self, offset: int, length: int):
+        """ Yields the uncompressed data from offset to offset+length
+            in parts as it is decompressed.
+        """
+        if offset < 0 or length < 0:
+            e = f'Invalid range {offset}, {length}'
+            raise Exception(e)
+        end = min(offset + length, self.size())
+        if offset >= end:
+            return
+
+        first = bisect_right(self.offsets, offset) - 1
+        last = bisect_left(self.offsets, end)
+        (pos, start) = self.index[first]
+        n_left = self.index[last][1] - start
+        self.f.seek(start)
+        decompressor = Decompressor('defl', self.stats,
+                                    self.zdict if first == 0 else None)
+        while n_left > 0 and pos < end:
+            data = self.f.read(min(n_left, READ_SIZE))
+            if len(data) == 0:
+                e = 'Unexpected end of data'
+                raise Exception(e)
+            n_left -= len(data)
+            part = decompressor.decompress(data)
+            if pos + len(part) > offset:
+                yield part[max(offset - pos, 0):end - pos]
+            pos += len(part)
+
+    def read_range(self, offset: int, length: int) -> bytearray:
+        """ Returns length bytes of the uncompressed data starting
+            from offset, or fewer if the data ends before that.
+        """
+        out = bytearray()
+        for part in self.read_parts(offset, length):
+            out += part
+        return out
+
+
+def read_range(filename: str, offset: int, length: int,
+               zdict: bytes = None) -> bytearray:
+    """ Returns length bytes of the uncompressed data of a seekable file
+        starting from offset.
+    """
+    with open(filename, 'rb') as f:
+        return SeekableReader(f, zdict=zdict).read_range(offset, length)
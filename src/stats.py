@@ -0,0 +1,123 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from lzss import LZSSTokens
+
+
+class Stats:
+    """ Collects statistics of compression or decompression:
+        the time spent in every stage, the LZSS tokens, the number of
+        positions the match finder compared and the sizes of
+        the block headers and the compressed data, and how many blocks
+        were compressed with each strategy.
+    """
+    def __init__(self):
+        # seconds spent in each stage, in the order the stages were seen
+        self.times = {}
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.blocks = 0
+        self.literals = 0
+        self.matches = 0
+        self.match_length_total = 0
+        self.match_dist_total = 0
+        self.probes = 0
+        self.header_bits = 0
+        self.payload_bits = 0
+        # the number of input blocks compressed with each strategy
+        self.strategies = {}
+
+    @contextmanager
+    def timer(self, stage: str):
+        """ Adds the time spent in the with block to the stage
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[stage] = self.times.get(stage, 0) + \
+                perf_counter() - start
+
+    def count_tokens(self, tokens: LZSSTokens):
+        """ Adds the literals and the matches of the tokens
+        """
+        literals = tokens.lengths.count(0)
+        self.literals += literals
+        self.matches += len(tokens) - literals
+        self.match_length_total += sum(tokens.lengths)
+        self.match_dist_total += sum(value for (length, value)
+                                     in zip(tokens.lengths, tokens.values)
+                                     if length > 0)
+
+    def count_match(self, length: int, dist: int):
+        """ Adds a single match
+        """
+        self.matches += 1
+        self.match_length_total += length
+        self.match_dist_total += dist
+
+    def merge(self, other: 'Stats'):
+        """ Adds the statistics of other to these
+        """
+        for (stage, seconds) in other.times.items():
+            self.times[stage] = self.times.get(stage, 0) + seconds
+        for name in ['input_bytes', 'output_bytes', 'blocks', 'literals',
+                     'matches', 'match_length_total', 'match_dist_total',
+                     'probes', 'header_bits', 'payload_bits']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for (strategy, n) in other.strategies.items():
+            self.strategies[strategy] = self.strategies.get(strategy, 0) + n
+
+    def average_match_length(self) -> float:
+        return self.match_length_total / max(self.matches, 1)
+
+    def average_match_dist(self) -> float:
+        return self.match_dist_total / max(self.matches, 1)
+
+    def as_dict(self) -> dict:
+        """ Returns the statistics as a dictionary, eg. for JSON
+        """
+        return {
+            'times': dict(self.times),
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'blocks': self.blocks,
+            'literals': self.literals,
+            'matches': self.matches,
+            'average_match_length': self.average_match_length(),
+            'average_match_dist': self.average_match_dist(),
+            'probes': self.probes,
+            'header_bytes': self.header_bits / 8,
+            'payload_bytes': self.payload_bits / 8,
+            'strategies': dict(self.strategies)
+        }
+
+    def report(self) -> str:
+        """ Returns the statistics as human readable text
+        """
+        lines = [f'{stage:<10} {seconds:10.3f} s'
+                 for (stage, seconds) in self.times.items()]
+        lines += [
+            f'blocks     {self.blocks}',
+            f'input      {self.input_bytes} bytes',
+            f'output     {self.output_bytes} bytes',
+            f'literals   {self.literals}',
+            f'matches    {self.matches}, average length '
+            f'{self.average_match_length():.1f}, average distance '
+            f'{self.average_match_dist():.1f}',
+            f'probes     {self.probes}',
+            f'headers    {self.header_bits // 8} bytes',
+            f'payload    {self.payload_bits // 8} bytes'
+        ]
+        if len(self.strategies) > 0:
+            lines.append('strategies ' + ', '.join(
+                f'{strategy} {n}' for (strategy, n)
+                in self.strategies.items()))
+        return '\n'.join(lines)
+
+
+def timer(stats: Stats, stage: str):
+    """ Times the stage if stats are collected
+    """
+    if stats is None:
+        return nullcontext()
+    return stats.timer(stage)
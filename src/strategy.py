@@ -0,0 +1,118 @@
+from blocksplit import entropy_bits
+from huffman import counts
+from lzss import RUN
+
+# 'lzss' searches the hash chains for matches, 'huffman' codes only
+# literals, 'rle' uses only matches at distance 1, 'stored' copies the data
+# as it is and 'auto' chooses one of them for every block.
+STRATEGIES = ['auto', 'lzss', 'huffman', 'rle', 'stored']
+
+# The strategy is chosen from SAMPLES evenly spaced pieces
+# of SAMPLE_SIZE bytes, smaller blocks are always compressed with LZSS.
+SAMPLES = 4
+SAMPLE_SIZE = 1024
+# the length of the strings looked up for earlier occurrences
+GRAM = 4
+# the positions of every piece looked up in the window before them
+PROBES = 8
+
+# Thresholds of the choice: less than MIN_REPEATS of the sample repeating
+# earlier strings is not worth searching for matches, and more than
+# MAX_ENTROPY bits per byte is not worth Huffman coding. The entropy of
+# a random sample of 4 kB is about 7.95 bits per byte.
+MIN_REPEATS = 0.1
+MAX_ENTROPY = 7.85
+# the runs have to cover this share of the repeats for RLE
+RUN_SHARE = 0.9
+
+
+def check_strategy(strategy: str):
+    if strategy not in STRATEGIES:
+        e = f'Unknown strategy {strategy}'
+        raise Exception(e)
+
+
+def sample_starts(size: int) -> list[int]:
+    """ Returns the starts of evenly spaced pieces of data of size bytes
+    """
+    if size <= SAMPLES * SAMPLE_SIZE:
+        return [0]
+    step = (size - SAMPLE_SIZE) // (SAMPLES - 1)
+    return list(range(0, SAMPLES * step, step))
+
+
+def sample(data: bytearray) -> list[bytes]:
+    """ Returns evenly spaced pieces of data
+    """
+    return [bytes(data[i:i+SAMPLE_SIZE]) for i in sample_starts(len(data))]
+
+
+def entropy(pieces: list[bytes]) -> float:
+    """ Returns the entropy of the bytes in bits per byte
+    """
+    data = b''.join(pieces)
+    return entropy_bits(counts(data, 256)) / max(len(data), 1)
+
+
+def repeat_share(piece: bytes) -> float:
+    """ Returns the share of the positions where the next GRAM bytes
+        have occurred earlier in the piece.
+    """
+    n = len(piece) - GRAM + 1
+    if n <= 0:
+        return 0
+    seen = {piece[i:i+GRAM] for i in range(0, n)}
+    return 1 - len(seen) / n
+
+
+def window_share(block: bytearray, history: bytes, start: int,
+                 window_size: int) -> float:
+    """ Returns the share of the probed positions of the piece at start
+        where the next GRAM bytes occur in the window_size bytes before
+        them, either earlier in the block or in the history before it.
+    """
+    found = 0
+    for pos in range(start, start + SAMPLE_SIZE, SAMPLE_SIZE // PROBES):
+        gram = block[pos:pos+GRAM]
+        first = pos - window_size
+        if block.find(gram, max(first, 0), pos + GRAM - 1) >= 0 or \
+                (first < 0 and
+                 history.find(gram, max(len(history) + first, 0)) >= 0):
+            found += 1
+    return found / PROBES
+
+
+def run_share(piece: bytes) -> float:
+    """ Returns the share of the bytes that repeat the previous byte
+        in runs long enough for a match.
+    """
+    return sum(run.end() - run.start() - 1
+               for run in RUN.finditer(piece)) / max(len(piece), 1)
+
+
+def choose_strategy(block: bytearray, history: bytes = b'',
+                    window_size: int = 2**15) -> str:
+    """ Chooses how to compress the block from a sample of it.
+        Data without repeated strings, such as already compressed files,
+        is stored if its bytes are evenly distributed and Huffman coded
+        otherwise. Data repeating mostly single bytes is RLE coded,
+        and everything else is left to LZSS. The repeats are looked for
+        inside the pieces, and if there are few, also at some positions
+        in the window before the pieces, ie. earlier in the block
+        and in history, the data given before the block.
+    """
+    if len(block) < SAMPLES * SAMPLE_SIZE:
+        return 'lzss'
+    pieces = sample(block)
+    repeats = sum(repeat_share(piece) for piece in pieces) / len(pieces)
+    if repeats < MIN_REPEATS:
+        starts = sample_starts(len(block))
+        repeats = max(repeats, sum(
+            window_share(block, history, start, window_size)
+            for start in starts) / len(starts))
+    if repeats < MIN_REPEATS:
+        return 'stored' if entropy(pieces) > MAX_ENTROPY else 'huffman'
+    runs = sum(run_share(piece) for piece in pieces) / len(pieces)
+    if runs >= RUN_SHARE * repeats:
+        return 'rle'
+    return 'lzss'
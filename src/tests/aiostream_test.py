@@ -0,0 +1,82 @@
+import asyncio
+import socket
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from aiostream import (
+    CompressWriter, DecompressReader, compress_stream, decompress_stream
+)
+from deflate import defl_decode, defl_encode
+
+
+async def read_all(reader: asyncio.StreamReader) -> bytearray:
+    out = bytearray()
+    chunk = await reader.read(2**16)
+    while len(chunk) > 0:
+        out += chunk
+        chunk = await reader.read(2**16)
+    return out
+
+
+class TestAsyncStreams(unittest.IsolatedAsyncioTestCase):
+    async def connected_streams(self) -> (asyncio.StreamReader,
+                                          asyncio.StreamWriter):
+        """ Returns a reader of the data written to the writer
+        """
+        (a, b) = socket.socketpair()
+        # the other ends are kept so that they are not closed
+        (reader, self.unused_writer) = await asyncio.open_connection(sock=a)
+        (self.unused_reader, writer) = await asyncio.open_connection(sock=b)
+        return (reader, writer)
+
+    async def test_compress_writer(self):
+        test_array = bytearray(b'compressed on the fly, ' * 5000)
+        (reader, writer) = await self.connected_streams()
+        with ThreadPoolExecutor(1) as executor:
+            out = CompressWriter(writer, 1, 'zlib', executor, chunk_size=4096)
+            received = asyncio.ensure_future(read_all(reader))
+            for i in range(0, len(test_array), 10000):
+                await out.write(test_array[i:i+10000])
+            await out.close()
+            writer.close()
+            self.assertEqual(zlib.decompress(await received), test_array)
+
+    async def test_decompress_reader(self):
+        test_array = bytearray(b'decompressed in small reads, ' * 3000)
+        reader = asyncio.StreamReader()
+        reader.feed_data(defl_encode(test_array, 1))
+        reader.feed_eof()
+        decompressed = DecompressReader(reader, chunk_size=100)
+        part = await decompressed.read(1000)
+        self.assertLessEqual(len(part), 1000)
+        part += await decompressed.read()
+        self.assertEqual(part, test_array)
+        self.assertTrue(decompressed.at_eof())
+
+    async def test_compress_and_decompress_stream(self):
+        test_array = bytearray(b'streams from a reader to a writer. ' * 2000)
+        source = asyncio.StreamReader()
+        source.feed_data(test_array)
+        source.feed_eof()
+        (reader, writer) = await self.connected_streams()
+        received = asyncio.ensure_future(read_all(reader))
+        await compress_stream(source, writer, 1, chunk_size=5000)
+        writer.close()
+        encoded = await received
+        self.assertEqual(defl_decode(encoded), test_array)
+
+        source = asyncio.StreamReader()
+        source.feed_data(encoded)
+        source.feed_eof()
+        (reader, writer) = await self.connected_streams()
+        received = asyncio.ensure_future(read_all(reader))
+        await decompress_stream(source, writer, chunk_size=1000)
+        writer.close()
+        self.assertEqual(await received, test_array)
+
+    async def test_truncated_stream(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(defl_encode(bytearray(b'truncated ' * 100))[:-3])
+        reader.feed_eof()
+        with self.assertRaises(Exception):
+            await DecompressReader(reader).read()
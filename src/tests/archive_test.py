@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from archive import (
+    archive_members, create_archive, extract_archive, find_files,
+    member_path, read_table
+)
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.files = {
+            'tree/a.txt': b'the first file ' * 100,
+            'tree/sub/b.txt': b'',
+            'tree/sub/c.bin': bytes(range(256)) * 10,
+        }
+        for (name, data) in self.files.items():
+            path = os.path.join(self.dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_files(self):
+        tree = os.path.join(self.dir, 'tree')
+        self.assertEqual(find_files([tree]),
+                         [os.path.join(tree, 'a.txt'),
+                          os.path.join(tree, 'sub', 'b.txt'),
+                          os.path.join(tree, 'sub', 'c.bin')])
+        self.assertEqual(len(find_files([tree], '.txt')), 2)
+
+    def test_create_and_extract(self):
+        archive = os.path.join(self.dir, 'files.dfla')
+        output = os.path.join(self.dir, 'out')
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            self.assertEqual(create_archive(['tree'], archive, jobs=2), 3)
+        finally:
+            os.chdir(cwd)
+        with open(archive, 'rb') as f:
+            table = read_table(f)
+        self.assertEqual([(name, size) for (name, size, _, _) in table],
+                         [(name, len(data))
+                          for (name, data) in self.files.items()])
+
+        self.assertEqual(extract_archive(archive, output, jobs=2), 3)
+        for (name, data) in self.files.items():
+            with open(os.path.join(output, name), 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_archive_inside_input(self):
+        tree = os.path.join(self.dir, 'tree')
+        archive = os.path.join(tree, 'sub', 'tree.dfla')
+        for _ in range(0, 2):
+            self.assertEqual(create_archive([tree], archive), 3)
+        with open(archive, 'rb') as f:
+            names = [name for (name, _, _, _) in read_table(f)]
+        self.assertNotIn('tree.dfla', ' '.join(names))
+
+    def test_names_outside_output_are_rejected(self):
+        for name in ['../evil', '/etc/passwd', 'a//b']:
+            with self.assertRaises(Exception):
+                member_path(name, self.dir)
+
+    def test_duplicate_names(self):
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            members = archive_members(['tree/sub', './tree/sub/b.txt',
+                                       'tree'])
+            self.assertEqual([name for (_, name) in members],
+                             ['tree/sub/b.txt', 'tree/sub/c.bin',
+                              'tree/a.txt'])
+            # both are named a.txt in the archive
+            os.chdir(os.path.join('tree', 'sub'))
+            with open('a.txt', 'wb') as f:
+                f.write(b'another file')
+            with self.assertRaises(Exception):
+                archive_members(['a.txt', '../a.txt'])
+        finally:
+            os.chdir(cwd)
@@ -0,0 +1,47 @@
+import unittest
+from batch import BatchDecoder, BatchEncoder, load_table, train_table
+from deflate import defl_encode
+
+
+class TestBatch(unittest.TestCase):
+    records = [b'{"id": %d, "name": "user%d", "active": true}' % (i, i*7)
+               for i in range(0, 100)]
+
+    def test_encode_decode(self):
+        table = train_table(self.records[:50])
+        encoder = BatchEncoder(table)
+        decoder = BatchDecoder([table])
+        for record in self.records[50:] + [b'', bytes(range(256))]:
+            self.assertEqual(decoder.decode(encoder.encode(record)), record)
+
+    def test_smaller_than_separate_blocks(self):
+        table = train_table(self.records[:50])
+        encoder = BatchEncoder(table)
+        for record in self.records[50:]:
+            self.assertLess(len(encoder.encode(record)),
+                            len(defl_encode(record)))
+
+    def test_table_with_dictionary(self):
+        table = train_table(self.records[:50], zdict=self.records[49])
+        loaded = load_table(table.to_bytes())
+        self.assertEqual(loaded.table_id, table.table_id)
+        decoder = BatchDecoder([loaded])
+        encoded = BatchEncoder(table).encode(self.records[60])
+        self.assertEqual(decoder.decode(encoded), self.records[60])
+
+    def test_unknown_table(self):
+        encoded = BatchEncoder(train_table(self.records)).encode(b'abc')
+        self.assertRaises(Exception, BatchDecoder().decode, encoded)
+
+    def test_encoder_is_reused(self):
+        table = train_table(self.records[:50], level=9,
+                            zdict=b''.join(self.records[:50]))
+        encoder = BatchEncoder(table)
+        decoder = BatchDecoder([table])
+        first = encoder.encode(self.records[70])
+        long_record = bytes(range(256)) * 200
+        self.assertEqual(decoder.decode(encoder.encode(long_record)),
+                         long_record)
+        self.assertEqual(encoder.encode(self.records[70]), first)
+        self.assertEqual(decoder.decode(first), self.records[70])
+        self.assertEqual(decoder.buffers[table.table_id], table.zdict)
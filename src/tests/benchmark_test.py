@@ -0,0 +1,20 @@
+import unittest
+from benchmark import KINDS, STAGES, generate, run_stage
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_corpus_is_reproducible(self):
+        for kind in KINDS:
+            data = generate(kind, 2000)
+            self.assertEqual(len(data), 2000)
+            self.assertEqual(data, generate(kind, 2000))
+            self.assertNotEqual(data, generate(kind, 2000, seed=1))
+
+    def test_run_stage(self):
+        data = generate('text', 1000)
+        for stage in STAGES:
+            result = run_stage(stage, data)
+            self.assertEqual(result['size'], 1000)
+            self.assertGreater(result['ratio'], 1)
+            self.assertGreater(result['encode_mb_s'], 0)
+            self.assertGreater(result['decode_peak_bytes'], 0)
@@ -0,0 +1,33 @@
+import random
+import unittest
+from blocksplit import entropy_bits, split_points
+from deflate import defl_encode, defl_decode
+from stats import Stats
+
+
+class TestBlockSplit(unittest.TestCase):
+    def test_entropy_bits(self):
+        self.assertEqual(entropy_bits([4, 4, 0]), 8)
+        self.assertEqual(entropy_bits([5]), 0)
+
+    def test_split_where_symbols_change(self):
+        lit_syms = [ord('a'), ord('b')]*2048 + list(range(256))*16
+        dist_syms = [-1]*len(lit_syms)
+        ends = split_points(lit_syms, dist_syms, (288, 32), (40, 10))
+        self.assertEqual(ends, [4096, len(lit_syms)])
+
+    def test_similar_symbols_are_not_split(self):
+        lit_syms = list(range(256))*32
+        dist_syms = [-1]*len(lit_syms)
+        ends = split_points(lit_syms, dist_syms, (288, 32), (40, 10))
+        self.assertEqual(ends, [len(lit_syms)])
+
+    def test_mixed_data_encode_decode(self):
+        rng = random.Random(0)
+        test_array = bytearray(rng.randbytes(20000) +
+                               bytes(rng.choices(b'abcd', k=20000)))
+        for fmt in ['defl', 'raw']:
+            stats = Stats()
+            compressed = defl_encode(test_array, fmt=fmt, stats=stats)
+            self.assertGreater(stats.blocks, 1)
+            self.assertEqual(defl_decode(compressed, fmt), test_array)
@@ -1,5 +1,5 @@
 import unittest
-from deflate import defl_encode, defl_decode
+from deflate import defl_encode, defl_decode, Compressor, Decompressor
 
 
 class TestDeflateFunctionality(unittest.TestCase):
@@ -7,6 +7,68 @@ class TestDeflateFunctionality(unittest.TestCase):
         test_array = bytearray(b'\xef\xbb\xbfdeflate deflates this string accordingly if it is to be deflated.\r\n') 
         self.assertEqual(defl_decode(defl_encode(test_array)), test_array)
 
+    def test_repetitive_encode_decode(self):
+        test_array = bytearray(b'abc'*5000 + bytes(range(256))*20)
+        self.assertEqual(defl_decode(defl_encode(test_array)), test_array)
+
+    def test_higher_level_compresses_more(self):
+        test_array = bytearray(b'deflate deflates, inflate inflates; ' * 50 +
+                               bytes(range(0, 256, 3)) * 10)
+        fast = defl_encode(test_array, 1)
+        best = defl_encode(test_array, 9)
+        self.assertEqual(defl_decode(fast), test_array)
+        self.assertEqual(defl_decode(best), test_array)
+        self.assertLessEqual(len(best), len(fast))
+
+    def test_without_matches_encode_decode(self):
+        for test_array in [bytearray(), bytearray(b'abc')]:
+            self.assertEqual(defl_decode(defl_encode(test_array)), test_array)
+
+    def test_compressor_output_does_not_depend_on_chunks(self):
+        test_array = bytearray(b'streaming blocks of deflate, ' * 300)
+        compressor = Compressor(block_size=1000)
+        out = bytearray()
+        for i in range(0, len(test_array), 777):
+            out += compressor.compress(test_array[i:i+777])
+        out += compressor.flush()
+        self.assertEqual(out, defl_encode(test_array, block_size=1000))
+        self.assertEqual(defl_decode(out), test_array)
+
+    def test_decompressor_one_byte_at_a_time(self):
+        test_array = bytearray(b'inflating one byte at a time, ' * 100)
+        encoded = defl_encode(test_array, block_size=500)
+        decompressor = Decompressor()
+        out = bytearray()
+        for i in range(0, len(encoded)):
+            self.assertFalse(decompressor.eof)
+            out += decompressor.decompress(encoded[i:i+1])
+        self.assertTrue(decompressor.eof)
+        self.assertEqual(out, test_array)
+
+    def test_truncated_data(self):
+        encoded = defl_encode(bytearray(b'truncated data ' * 10))
+        with self.assertRaises(Exception):
+            defl_decode(encoded[:-1])
+
+    def test_parallel_encode_decode(self):
+        test_array = bytearray(b'parallel blocks refer to previous blocks ' * 200)
+        encoded = defl_encode(test_array, block_size=1000, jobs=2)
+        self.assertEqual(defl_decode(encoded), test_array)
+        # the blocks are primed with the previous data
+        self.assertLess(len(encoded), len(test_array) // 10)
+
+    def test_preset_dictionary(self):
+        zdict = b'{"id": 1, "name": "alice", "active": true}' * 2
+        test_array = bytearray(b'{"id": 2, "name": "bob", "active": false}')
+        for fmt in ['defl', 'raw', 'zlib']:
+            encoded = defl_encode(test_array, fmt=fmt, zdict=zdict)
+            self.assertLess(len(encoded), len(defl_encode(test_array,
+                                                          fmt=fmt)))
+            self.assertEqual(defl_decode(encoded, fmt, zdict=zdict),
+                             test_array)
+        encoded = defl_encode(test_array, fmt='zlib', zdict=zdict)
+        self.assertRaises(Exception, defl_decode, encoded, 'zlib')
+
 
 if __name__ == '__main__':
     unittest.main()
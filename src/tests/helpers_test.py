@@ -0,0 +1,49 @@
+import unittest
+from helpers import BitReader, BitWriter
+
+
+class TestBitWriter(unittest.TestCase):
+    def test_bits_are_written_lowest_first(self):
+        out = BitWriter()
+        out.write(1, 1)
+        out.write(0, 1)
+        out.write(0b101, 3)
+        self.assertEqual(out.getvalue(), bytearray([0b10101]))
+
+    def test_write_bytes_aligns(self):
+        out = BitWriter()
+        out.write(0b11, 2)
+        out.write_bytes(b'ab')
+        out.write(0x1ff, 9)
+        self.assertEqual(out.getvalue(), bytearray(b'\x03ab\xff\x01'))
+
+    def test_grows_past_size_hint(self):
+        out = BitWriter(1)
+        for i in range(1000):
+            out.write(i % 128, 7)
+        self.assertEqual(len(out.getvalue()), 875)
+
+
+class TestBitReader(unittest.TestCase):
+    def test_reads_what_bitwriter_wrote(self):
+        out = BitWriter()
+        values = [(i*37 % 1000, 10) for i in range(100)]
+        for (value, n_bits) in values:
+            out.write(value, n_bits)
+        in_bits = BitReader(out.getvalue())
+        for (value, n_bits) in values:
+            self.assertEqual(in_bits.read(n_bits), value)
+
+    def test_peek_does_not_consume(self):
+        in_bits = BitReader(bytearray([0b10110]))
+        self.assertEqual(in_bits.peek(3), 0b110)
+        self.assertEqual(in_bits.read(5), 0b10110)
+
+    def test_reading_past_end(self):
+        in_bits = BitReader(bytearray([1]))
+        with self.assertRaises(Exception):
+            in_bits.read(9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from huffman import huff_encode, huff_decode
+from huffman import huff_encode, huff_decode, limited_code_lens, TableCache
 
 
 class TestHuffFunctionality(unittest.TestCase):
@@ -7,6 +7,42 @@ class TestHuffFunctionality(unittest.TestCase):
         test_array = bytearray(b'testing a testy tester in a tester network of testers')
         self.assertEqual(huff_decode(huff_encode(test_array)), test_array)
 
+    def test_long_codes_encode_decode(self):
+        # fibonacci counts make the code lengths longer than the first table
+        test_array = bytearray()
+        (a, b) = (1, 1)
+        for i in range(0, 20):
+            test_array += bytes([i])*a
+            (a, b) = (b, a+b)
+        self.assertEqual(huff_decode(huff_encode(test_array)), test_array)
+
+    def test_code_lens_are_limited(self):
+        count_list = [2**i for i in range(0, 20)] + [0, 0]
+        code_lens = limited_code_lens(count_list, 7)
+        self.assertEqual(max(code_lens), 7)
+        self.assertEqual(code_lens[-2:], [0, 0])
+        # the code is complete
+        self.assertEqual(sum(2**-l for l in code_lens if l > 0), 1)
+
+    def test_code_lens_without_limit_are_optimal(self):
+        self.assertEqual(limited_code_lens([1, 1, 2, 4]), [3, 3, 2, 1])
+
+    def test_table_cache(self):
+        cache = TableCache(2)
+        first = cache.get(b'a', lambda: [1, 1])
+        self.assertIs(cache.get(b'a', lambda: [1, 1]), first)
+        cache.get(b'b', lambda: [2, 2, 1])
+        cache.get(b'c', lambda: [1, 2, 2])
+        # b'a' was the least recently used table
+        self.assertNotIn(b'a', cache.tables)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_cached_tables_decode(self):
+        test_array = bytearray(b'the same header twice')
+        encoded = huff_encode(test_array)
+        self.assertEqual(huff_decode(encoded), test_array)
+        self.assertEqual(huff_decode(encoded), test_array)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,166 @@
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+# io.py has the same name as the standard library module,
+# so it is loaded from its path
+IO_PATH = os.path.join(os.path.dirname(__file__), '..', 'io.py')
+spec = importlib.util.spec_from_file_location('cli', IO_PATH)
+cli = importlib.util.module_from_spec(spec)
+# the worker processes find the functions of the module by its name
+sys.modules['cli'] = cli
+spec.loader.exec_module(cli)
+
+
+class TestIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.data = b''.join(b'line %d of the test file\n' % i
+                             for i in range(0, 2000))
+        self.path = self.write('file.txt', self.data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def read(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_deflate_and_inflate_file(self):
+        for fmt in cli.FORMATS:
+            cli.deflate_file(self.path, level=1, fmt=fmt)
+            self.assertTrue(os.path.exists(self.path + cli.EXTENSIONS[fmt]))
+            output = os.path.join(self.dir, 'out.' + fmt)
+            cli.inflate_file(self.path, output, fmt)
+            self.assertEqual(self.read(output), self.data)
+
+    def test_standard_input_and_output(self):
+        stdin = SimpleNamespace(buffer=io.BytesIO(self.data))
+        stdout = SimpleNamespace(buffer=io.BytesIO())
+        with mock.patch('sys.stdin', stdin), mock.patch('sys.stdout', stdout):
+            cli.main(['io.py', 'deflate', '-1', '-'])
+        encoded = stdout.buffer.getvalue()
+
+        stdin = SimpleNamespace(buffer=io.BytesIO(encoded))
+        stdout = SimpleNamespace(buffer=io.BytesIO())
+        with mock.patch('sys.stdin', stdin), mock.patch('sys.stdout', stdout):
+            cli.main(['io.py', 'inflate', '-'])
+        self.assertEqual(stdout.buffer.getvalue(), self.data)
+
+    def test_levels(self):
+        sizes = []
+        for level in ['-1', '-6']:
+            output = os.path.join(self.dir, 'level' + level)
+            cli.main(['io.py', 'deflate', level, '-o', output + '.defl',
+                      self.path])
+            cli.main(['io.py', 'inflate', output])
+            self.assertEqual(self.read(output + '.infl'), self.data)
+            sizes.append(os.path.getsize(output + '.defl'))
+        self.assertLessEqual(sizes[1], sizes[0])
+
+    def test_stats(self):
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            cli.main(['io.py', 'deflate', '--stats', self.path])
+        self.assertIn(f'input      {len(self.data)} bytes',
+                      stderr.getvalue())
+
+    def test_read_range(self):
+        cli.main(['io.py', 'deflate', '-1', '--seekable',
+                  '--sync-interval', '5000', self.path])
+        output = os.path.join(self.dir, 'range')
+        cli.main(['io.py', 'read', '--offset', '12345', '--length', '100',
+                  '-o', output, self.path])
+        self.assertEqual(self.read(output), self.data[12345:12445])
+
+    def test_parallel_inflate(self):
+        cli.main(['io.py', 'deflate', '-1', '-j', '2', self.path])
+        cli.main(['io.py', 'inflate', '-j', '2', self.path])
+        self.assertEqual(self.read(self.path + '.infl'), self.data)
+
+    def test_many_files(self):
+        other = self.write('tree/sub/other.txt', b'another file ' * 100)
+        tree = os.path.join(self.dir, 'tree')
+        cli.main(['io.py', 'deflate', '-1', '-j', '2', self.path, tree])
+        os.remove(other)
+        cli.main(['io.py', 'inflate', '-j', '2', self.path, tree])
+        self.assertEqual(self.read(self.path + '.infl'), self.data)
+        self.assertEqual(self.read(other + '.infl'), b'another file ' * 100)
+
+    def test_compressed_files_are_skipped(self):
+        other = self.write('tree/other.txt', b'another file ' * 100)
+        self.write('tree/old.gz', b'compressed')
+        tree = os.path.join(self.dir, 'tree')
+        cli.main(['io.py', 'deflate', '-1', tree])
+        cli.main(['io.py', 'inflate', tree])
+        cli.main(['io.py', 'deflate', '-1', tree])
+        self.assertEqual(sorted(os.listdir(tree)),
+                         ['old.gz', 'other.txt', 'other.txt.defl',
+                          'other.txt.infl'])
+        self.assertEqual(self.read(other + '.infl'), b'another file ' * 100)
+
+    def test_archive(self):
+        self.write('tree/sub/other.txt', b'another file ' * 100)
+        archive = os.path.join(self.dir, 'files.dfla')
+        output = os.path.join(self.dir, 'out')
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            cli.main(['io.py', 'deflate', '-1', '-a', archive, 'file.txt',
+                      'tree'])
+        finally:
+            os.chdir(cwd)
+        cli.main(['io.py', 'inflate', '-a', archive, '-o', output])
+        self.assertEqual(self.read(os.path.join(output, 'file.txt')),
+                         self.data)
+        self.assertEqual(
+            self.read(os.path.join(output, 'tree', 'sub', 'other.txt')),
+            b'another file ' * 100)
+
+    def test_rejected_options(self):
+        for args in [['deflate'],
+                     ['read', self.path, self.path],
+                     ['deflate', '-o', 'out', self.path, self.path],
+                     ['read', '-a', 'archive'],
+                     ['deflate', '-f', 'raw', '-j', '2', self.path],
+                     ['deflate', '--seekable', '-f', 'zlib', self.path],
+                     ['deflate', '--stats', self.path, self.path],
+                     ['deflate', '--seekable', self.dir],
+                     ['inflate', '--sync-interval', '100', self.path,
+                      self.path],
+                     ['deflate', '-a', 'archive', '--stats', self.path],
+                     ['deflate', '-a', 'archive', '-f', 'gzip', self.path],
+                     ['inflate', '-a', 'archive', '--seekable']]:
+            with self.assertRaises(Exception):
+                cli.main(['io.py'] + args)
+
+    def test_option_errors(self):
+        with self.assertRaisesRegex(Exception, 'requires --seekable'):
+            cli.main(['io.py', 'deflate', '--sync-interval', '100',
+                      self.path])
+        self.assertFalse(os.path.exists(self.path + '.defl'))
+        with self.assertRaisesRegex(Exception, 'not standard input'):
+            cli.main(['io.py', 'read', '-'])
+
+    def test_missing_file(self):
+        result = subprocess.run(
+            [sys.executable, IO_PATH, 'deflate',
+             os.path.join(self.dir, 'missing')],
+            capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('No such file', result.stderr)
+        self.assertNotIn('Traceback', result.stderr)
@@ -1,5 +1,7 @@
+import random
 import unittest
-from lzss import lzss_encode, lzss_decode
+from lzss import lzss_encode, lzss_decode, to_lzss, append_match, copy_match
+from lzss import build_dictionary, lzss_to_decrypted, LZSSEncoder
 
 
 class TestLZSSFunctionality(unittest.TestCase):
@@ -22,6 +24,103 @@ class TestLZSSFunctionality(unittest.TestCase):
         test_string = bytearray(b'testing a testy tester in a tester network of testers')
         self.assertEqual(lzss_decode(lzss_encode(test_string)), test_string)
 
+    def test_long_run_encode_decode(self):
+        test_string = bytearray(b'a'*1000 + b'ab'*300)
+        self.assertEqual(lzss_decode(lzss_encode(test_string)), test_string)
+
+    def test_to_lzss_uses_longest_match(self):
+        test_string = bytearray(b'abcdefgh1abcd2abcdefgh')
+        nodes = list(to_lzss(test_string, 2**15))
+        self.assertEqual(nodes[-1].value(), (14, 8))
+
+    def test_all_levels_encode_decode(self):
+        test_string = bytearray(b'abracadabra abrahadabra cadabra ' * 20)
+        for level in range(1, 10):
+            encoded = lzss_encode(test_string, level=level)
+            self.assertEqual(lzss_decode(encoded), test_string)
+
+    def test_invalid_level(self):
+        with self.assertRaises(Exception):
+            to_lzss(bytearray(b'test'), 2**15, 10)
+
+    def test_window_slides_over_long_input(self):
+        test_string = bytearray(b'sliding window ' * 100 + bytes(range(256)) * 4)
+        for buffer_size in [5, 50, 256]:
+            encoded = lzss_encode(test_string, buffer_size)
+            self.assertEqual(lzss_decode(encoded), test_string)
+
+    def test_tokens_are_packed(self):
+        tokens = to_lzss(bytearray(b'abcabcabc'), 2**15)
+        self.assertEqual(list(tokens.lengths), [0, 0, 0, 6])
+        self.assertEqual(list(tokens.values), [97, 98, 99, 3])
+        self.assertEqual(tokens[3].value(), (3, 6))
+
+    def test_overlapping_match_copy(self):
+        out = bytearray(b'abc')
+        append_match(out, 10, 3)
+        self.assertEqual(out, bytearray(b'abcabcabcabca'))
+        out = bytearray(b'xy') + bytearray(9)
+        copy_match(out, 2, 9, 1)
+        self.assertEqual(out, bytearray(b'xyyyyyyyyyy'))
+
+    def test_preset_dictionary(self):
+        zdict = b'{"name": "", "email": ""}'
+        test_array = bytearray(b'{"name": "x", "email": "y"}')
+        tokens = to_lzss(test_array, 2**15, zdict=zdict)
+        self.assertLess(len(tokens), len(test_array) // 2)
+        self.assertEqual(lzss_to_decrypted(tokens, zdict), test_array)
+
+    def test_build_dictionary(self):
+        samples = [b'{"id": %d, "name": "user%d"}' % (i, i*7)
+                   for i in range(0, 50)]
+        zdict = build_dictionary(samples, 100)
+        self.assertLessEqual(len(zdict), 100)
+        self.assertIn(b', "name": "user', zdict)
+
+    def test_encode_runs(self):
+        test_array = bytearray(b'ab' + b'c'*600 + b'dd' + b'eeee')
+        tokens = LZSSEncoder(2**15).encode_runs(test_array)
+        self.assertEqual(set(tokens.values[i] for i in range(len(tokens))
+                             if tokens.lengths[i] > 0), {1})
+        self.assertEqual(lzss_to_decrypted(tokens), test_array)
+
+    def test_skip_keeps_history(self):
+        test_array = bytearray(b'history of the encoder, ' * 100)
+        encoder = LZSSEncoder(2**15)
+        out = lzss_to_decrypted(encoder.encode(test_array, False))
+        out += encoder.skip(b'not encoded')
+        out += lzss_to_decrypted(encoder.encode_literals(b' literals'))
+        tokens = encoder.encode(test_array)
+        self.assertLess(len(tokens), 20)
+        out += lzss_to_decrypted(tokens, out)
+        self.assertEqual(out, test_array + b'not encoded literals' +
+                         test_array)
+
+    def test_skipped_data_can_be_referred_to(self):
+        test_array = bytearray(random.Random(0).randbytes(5000))
+        for level in [1, 6, 9]:
+            encoder = LZSSEncoder(2**15, level)
+            out = encoder.skip(test_array)
+            out += lzss_to_decrypted(encoder.encode_literals(b'literals'))
+            tokens = encoder.encode(test_array)
+            self.assertLess(len(tokens), 40)
+            out += lzss_to_decrypted(tokens, out)
+            self.assertEqual(out, test_array + b'literals' + test_array)
+
+    def test_rollback_restores_history(self):
+        zdict = b'some words, some more words and other words ' * 50
+        record = b'more words and some other words'
+        for level in [1, 6, 9]:
+            encoder = LZSSEncoder(100, level)
+            encoder.prime(zdict)
+            expected = [str(node) for node in encoder.copy().encode(record)]
+            state = encoder.checkpoint(len(record))
+            encoder.encode(b'words and other words, some more words')
+            encoder.rollback(state)
+            self.assertEqual([str(node) for node in encoder.encode(record)],
+                             expected)
+            self.assertIsNone(encoder.checkpoint(101))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+import random
+import unittest
+import npbackend
+from helpers import BitWriter
+from huffman import (
+    canonical_huffcode, code_values, huff_decode, huff_encode,
+    limited_code_lens
+)
+
+
+@unittest.skipIf(npbackend.np is None, 'NumPy is not installed')
+class TestNumPyBackend(unittest.TestCase):
+    def test_canonical_code_values(self):
+        rng = random.Random(0)
+        for i in range(0, 50):
+            count_list = [rng.choice([0, 1, 3, rng.randrange(10**6)])
+                          for sym in range(0, 288)]
+            code_lens = limited_code_lens(count_list)
+            self.assertEqual(npbackend.canonical_code_values(code_lens),
+                             code_values(canonical_huffcode(code_lens)))
+
+    def test_pack_codes(self):
+        code_lens = [3, 3, 2, 1]
+        values = code_values(canonical_huffcode(code_lens))
+        symbols = [3, 0, 1, 2, 3, 3, 1]
+        out = BitWriter()
+        for sym in symbols:
+            out.write(values[sym], code_lens[sym])
+        (packed, rest, n_rest) = npbackend.pack_codes(
+            npbackend.np.array(symbols), values, code_lens)
+        self.assertEqual(len(packed)*8 + n_rest, 14)
+        expected = out.getvalue()
+        self.assertEqual(packed, expected[:-1])
+        self.assertEqual(rest, expected[-1])
+
+    def test_same_output_as_pure_python(self):
+        rng = random.Random(1)
+        test_array = bytearray(rng.choices(b'abcdefgh\n ', k=50000))
+        encoded = huff_encode(test_array)
+        min_symbols = npbackend.MIN_SYMBOLS
+        npbackend.MIN_SYMBOLS = len(test_array) + 1
+        try:
+            self.assertEqual(huff_encode(test_array), encoded)
+        finally:
+            npbackend.MIN_SYMBOLS = min_symbols
+        self.assertEqual(huff_decode(encoded), test_array)
@@ -0,0 +1,32 @@
+import io
+import unittest
+from deflate import ParallelCompressor, defl_decode, defl_encode
+from parallel import ParallelDecompressor
+from seekable import SeekableCompressor
+
+
+def decompress(data: bytearray, zdict: bytes = None) -> bytearray:
+    decompressor = ParallelDecompressor(io.BytesIO(data), 2, zdict=zdict)
+    return b''.join(decompressor.decompress())
+
+
+class TestParallelDecompressor(unittest.TestCase):
+    def test_sync_points(self):
+        test_array = bytearray(b'independent parts between sync points ' * 500)
+        compressor = SeekableCompressor(1, sync_interval=3000)
+        encoded = compressor.compress(test_array) + compressor.flush()
+        self.assertEqual(decompress(encoded), test_array)
+
+    def test_block_index(self):
+        zdict = b'blocks refer to the previous blocks'
+        test_array = bytearray(b'the previous blocks are the dictionary, ' *
+                               500)
+        compressor = ParallelCompressor(1, block_size=2000, zdict=zdict,
+                                        index=True)
+        encoded = compressor.compress(test_array) + compressor.flush()
+        self.assertEqual(defl_decode(encoded, zdict=zdict), test_array)
+        self.assertEqual(decompress(encoded, zdict), test_array)
+
+    def test_file_without_index(self):
+        with self.assertRaises(Exception):
+            decompress(defl_encode(bytearray(b'no index')))
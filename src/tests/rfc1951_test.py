@@ -0,0 +1,82 @@
+import gzip
+import unittest
+import zlib
+from deflate import defl_encode, defl_decode, Decompressor
+from helpers import BitWriter
+from rfc1951 import (
+    LENGTH_BASE, LENGTH_CODES, dist_code, dynamic_header, header_bits,
+    rle_code_lens, write_dynamic_header
+)
+
+
+class TestRFC1951Functionality(unittest.TestCase):
+    test_array = bytearray(b'deflate deflates, inflate inflates; ' * 500 +
+                           bytes(range(256)) * 4 + b'x' * 1000)
+
+    def test_code_tables(self):
+        self.assertEqual(LENGTH_CODES[3], 0)
+        self.assertEqual(LENGTH_CODES[257], 27)
+        self.assertEqual(LENGTH_CODES[258], 28)
+        self.assertEqual(LENGTH_BASE[LENGTH_CODES[100]], 99)
+        self.assertEqual(dist_code(1), 0)
+        self.assertEqual(dist_code(5), 4)
+        self.assertEqual(dist_code(257), 16)
+        self.assertEqual(dist_code(32768), 29)
+
+    def test_rle_code_lens(self):
+        self.assertEqual(rle_code_lens([0]*20 + [5]*5 + [0, 0]),
+                         [(18, 9, 7), (5, 0, 0), (16, 1, 2), (0, 0, 0),
+                          (0, 0, 0)])
+
+    def test_header_bits(self):
+        for (lit_lens, dist_lens) in [([8]*144 + [9]*112 + [7]*24 + [8]*6,
+                                       [5]*30),
+                                      ([0]*65 + [1] + [0]*190 + [1] + [0]*29,
+                                       [1, 1] + [0]*28)]:
+            header = dynamic_header(lit_lens, dist_lens)
+            out = BitWriter()
+            write_dynamic_header(header, out)
+            self.assertEqual(out.bit_pos(), header_bits(header))
+
+    def test_zlib_decompresses_output(self):
+        for level in [1, 6, 9]:
+            raw = defl_encode(self.test_array, level, fmt='raw')
+            self.assertEqual(zlib.decompressobj(-15).decompress(raw),
+                             self.test_array)
+            self.assertEqual(
+                zlib.decompress(defl_encode(self.test_array, level,
+                                            fmt='zlib')), self.test_array)
+            self.assertEqual(
+                gzip.decompress(defl_encode(self.test_array, level,
+                                            fmt='gzip')), self.test_array)
+
+    def test_decode_zlib_output(self):
+        for level in [0, 1, 9]:
+            compressed = zlib.compress(self.test_array, level)
+            self.assertEqual(defl_decode(compressed, 'zlib'), self.test_array)
+            compressed = gzip.compress(self.test_array, level)
+            self.assertEqual(defl_decode(compressed, 'gzip'), self.test_array)
+
+    def test_decompressor_byte_at_a_time(self):
+        compressed = zlib.compress(self.test_array)
+        decompressor = Decompressor('zlib')
+        out = bytearray()
+        for i in range(0, len(compressed)):
+            out += decompressor.decompress(compressed[i:i+1])
+        self.assertTrue(decompressor.eof)
+        self.assertEqual(out, self.test_array)
+
+    def test_zlib_preset_dictionary(self):
+        zdict = bytes(self.test_array[:1000])
+        compressed = defl_encode(self.test_array, fmt='zlib', zdict=zdict)
+        decompressor = zlib.decompressobj(zdict=zdict)
+        self.assertEqual(decompressor.decompress(compressed), self.test_array)
+        compressor = zlib.compressobj(zdict=zdict)
+        compressed = compressor.compress(self.test_array) + compressor.flush()
+        self.assertEqual(defl_decode(compressed, 'zlib', zdict=zdict),
+                         self.test_array)
+
+    def test_invalid_checksum(self):
+        compressed = bytearray(zlib.compress(self.test_array))
+        compressed[-1] ^= 1
+        self.assertRaises(Exception, defl_decode, compressed, 'zlib')
@@ -0,0 +1,49 @@
+import io
+import unittest
+from deflate import defl_decode
+from seekable import SeekableCompressor, SeekableReader
+
+
+def compress(data: bytearray, sync_interval: int, zdict: bytes = None,
+             chunk_size: int = 1000) -> bytearray:
+    compressor = SeekableCompressor(1, block_size=2000,
+                                    sync_interval=sync_interval, zdict=zdict)
+    out = bytearray()
+    for i in range(0, len(data), chunk_size):
+        out += compressor.compress(data[i:i+chunk_size])
+    return out + compressor.flush()
+
+
+class TestSeekable(unittest.TestCase):
+    def test_read_range(self):
+        test_array = bytearray(b''.join(b'line %d of the log\n' % i
+                                        for i in range(0, 3000)))
+        reader = SeekableReader(io.BytesIO(compress(test_array, 5000)))
+        self.assertEqual(reader.size(), len(test_array))
+        for (offset, length) in [(0, 10), (4990, 20), (5000, 5000),
+                                 (12345, 30000), (len(test_array) - 5, 100),
+                                 (len(test_array) + 5, 10), (100, 0)]:
+            self.assertEqual(reader.read_range(offset, length),
+                             test_array[offset:offset+length])
+
+    def test_index_is_ignored_by_decode(self):
+        test_array = bytearray(b'sync points reset the history. ' * 1000)
+        encoded = compress(test_array, 4096)
+        self.assertEqual(defl_decode(encoded), test_array)
+        index = SeekableReader(io.BytesIO(encoded)).index
+        self.assertEqual([offset for (offset, _) in index],
+                         list(range(0, len(test_array), 4096)) +
+                         [len(test_array)])
+
+    def test_preset_dictionary(self):
+        zdict = b'sync points reset the history'
+        test_array = bytearray(b'the history of sync points. ' * 500)
+        encoded = compress(test_array, 3000, zdict)
+        reader = SeekableReader(io.BytesIO(encoded), zdict=zdict)
+        self.assertEqual(reader.read_range(6500, 200),
+                         test_array[6500:6700])
+        self.assertEqual(defl_decode(encoded, zdict=zdict), test_array)
+
+    def test_file_without_index(self):
+        with self.assertRaises(Exception):
+            SeekableReader(io.BytesIO(b'no index here'))
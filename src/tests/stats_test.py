@@ -0,0 +1,39 @@
+import unittest
+from deflate import defl_encode, defl_decode
+from stats import Stats
+
+
+class TestStats(unittest.TestCase):
+    test_array = bytearray(b'deflate deflates, inflate inflates; ' * 200 +
+                           bytes(range(256)))
+
+    def test_encoder_and_decoder_agree(self):
+        for fmt in ['defl', 'raw']:
+            encoded = Stats()
+            decoded = Stats()
+            compressed = defl_encode(self.test_array, block_size=2000,
+                                     fmt=fmt, stats=encoded)
+            defl_decode(compressed, fmt, decoded)
+            self.assertEqual(encoded.blocks, 4)
+            self.assertEqual(encoded.literals, decoded.literals)
+            self.assertEqual(encoded.matches, decoded.matches)
+            self.assertEqual(encoded.literals + encoded.match_length_total,
+                             len(self.test_array))
+            self.assertEqual(encoded.header_bits, decoded.header_bits)
+            self.assertEqual(encoded.output_bytes, len(compressed))
+            self.assertEqual(decoded.output_bytes, len(self.test_array))
+            self.assertGreater(encoded.probes, 0)
+            self.assertIn('lzss', encoded.times)
+            self.assertIn('decode', decoded.times)
+
+    def test_merge(self):
+        stats = Stats()
+        other = Stats()
+        with other.timer('lzss'):
+            other.count_match(10, 100)
+        stats.merge(other)
+        stats.merge(other)
+        self.assertEqual(stats.matches, 2)
+        self.assertEqual(stats.average_match_length(), 10)
+        self.assertEqual(stats.average_match_dist(), 100)
+        self.assertIn('lzss', stats.as_dict()['times'])
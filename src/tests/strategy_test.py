@@ -0,0 +1,57 @@
+import random
+import unittest
+import zlib
+from deflate import defl_encode, defl_decode
+from stats import Stats
+from strategy import STRATEGIES, choose_strategy
+
+
+class TestStrategy(unittest.TestCase):
+    def test_choose_strategy(self):
+        rng = random.Random(0)
+        text = b'the strategy is chosen for every block of the input. ' * 200
+        skewed = bytes(rng.choices(range(256), weights=range(256), k=20000))
+        runs = bytes(b for b in rng.randbytes(2000) for _ in range(10))
+        self.assertEqual(choose_strategy(text), 'lzss')
+        self.assertEqual(choose_strategy(rng.randbytes(20000)), 'stored')
+        self.assertEqual(choose_strategy(skewed), 'huffman')
+        self.assertEqual(choose_strategy(runs), 'rle')
+        self.assertEqual(choose_strategy(b'tiny'), 'lzss')
+
+    def test_strategies_encode_decode(self):
+        rng = random.Random(1)
+        test_array = bytearray(b'text that repeats, ' * 1000 +
+                               rng.randbytes(30000) + bytes(20000) +
+                               bytes(rng.choices(b'abcdefgh', k=30000)))
+        for strategy in STRATEGIES:
+            for fmt in ['defl', 'raw']:
+                encoded = defl_encode(test_array, 1, block_size=10000,
+                                      fmt=fmt, strategy=strategy)
+                self.assertEqual(defl_decode(encoded, fmt), test_array)
+                if fmt == 'raw':
+                    self.assertEqual(zlib.decompress(encoded, -15),
+                                     test_array)
+
+    def test_random_data_is_stored(self):
+        test_array = bytearray(random.Random(2).randbytes(100000))
+        stats = Stats()
+        encoded = defl_encode(test_array, fmt='zlib', stats=stats)
+        self.assertEqual(stats.strategies, {'stored': 2})
+        self.assertLess(len(encoded), len(test_array) + 32)
+        self.assertEqual(zlib.decompress(encoded), test_array)
+
+    def test_long_distance_repeats(self):
+        rng = random.Random(3)
+        for (period, block_size) in [(1500, 2**16), (2000, 2**16),
+                                     (5000, 8192)]:
+            test_array = bytearray(rng.randbytes(period) * 60)
+            sizes = [len(defl_encode(test_array, block_size=block_size,
+                                     strategy=strategy))
+                     for strategy in ['auto', 'lzss']]
+            self.assertLess(sizes[0], sizes[1] * 1.05)
+        self.assertEqual(choose_strategy(test_array[5000:15000],
+                                         bytes(test_array[:5000])), 'lzss')
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(Exception):
+            defl_encode(bytearray(b'abc'), strategy='fast')